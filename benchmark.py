@@ -0,0 +1,287 @@
+import argparse
+import contextlib
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import steamworksparser
+
+# Roughly what one Steamworks SDK drop contains, scale 1 generates about this much
+g_SdkInterfaces = 30
+g_FunctionsPerInterface = 30
+g_CallbacksPerInterface = 10
+g_EnumsPerInterface = 4
+
+
+def generate_corpus(folder, scale=1, seed=0):
+    """Writes synthetic Steamworks-style headers into folder, scale 1 is about the size of the real SDK"""
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+
+    with open(os.path.join(folder, "steamsynthtypes.h"), 'w') as out:
+        out.write(generate_types_header())
+
+    for i in range(g_SdkInterfaces * scale):
+        with open(os.path.join(folder, f"isteamsynth{i}.h"), 'w') as out:
+            out.write(generate_interface_header(i, rng))
+
+
+def generate_types_header():
+    lines = [
+        "//====== Copyright Valve Corporation, All rights reserved. ====================",
+        "//",
+        "// Purpose: synthetic base types",
+        "//",
+        "//=============================================================================",
+        "",
+        "#ifndef STEAMSYNTHTYPES_H",
+        "#define STEAMSYNTHTYPES_H",
+        "",
+        "typedef unsigned char uint8;",
+        "typedef signed char int8;",
+        "typedef short int16;",
+        "typedef unsigned short uint16;",
+        "typedef int int32;",
+        "typedef unsigned int uint32;",
+        "typedef long long int64;",
+        "typedef unsigned long long uint64;",
+        "",
+        "typedef uint64 SteamAPICall_t;",
+        "const SteamAPICall_t k_uAPICallInvalid = 0x0;",
+        "",
+        "typedef uint32 AppId_t;",
+        "typedef uint64 PublishedFileId_t;",
+        "",
+        "const int k_cchSynthNameMax = 128;",
+        "#define k_iSteamSynthCallbacks 10000",
+        "",
+        "// General result codes",
+        "enum EResult",
+        "{",
+        "\tk_EResultNone = 0,\t\t\t\t\t\t\t// no result",
+        "\tk_EResultOK\t= 1,\t\t\t\t\t\t\t// success",
+        "\tk_EResultFail = 2,\t\t\t\t\t\t\t// generic failure",
+        "};",
+        "",
+        "#endif // STEAMSYNTHTYPES_H",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def generate_interface_header(i, rng):
+    guard = f"ISTEAMSYNTH{i}_H"
+    lines = [
+        "//====== Copyright Valve Corporation, All rights reserved. ====================",
+        "//",
+        f"// Purpose: synthetic interface {i}",
+        "//",
+        "//=============================================================================",
+        "",
+        f"#ifndef {guard}",
+        f"#define {guard}",
+        "#ifdef _WIN32",
+        "#pragma once",
+        "#endif",
+        "",
+        '#include "steam_api_common.h"',
+        '#include "steamsynthtypes.h"',
+        "",
+        "// Handles, the alias makes a typedef chain",
+        f"typedef uint64 SynthHandle{i}_t;",
+        f"typedef SynthHandle{i}_t SynthAlias{i}_t;",
+        f"const SynthHandle{i}_t k_SynthHandle{i}Invalid = 0;",
+        "",
+    ]
+
+    for e in range(g_EnumsPerInterface):
+        lines.append(f"// Synthetic enum {e}")
+        lines.append(f"enum ESynth{i}Kind{e}")
+        lines.append("{")
+        for v in range(rng.randint(3, 12)):
+            lines.append(f"\tk_ESynth{i}Kind{e}_Value{v} = {v},\t\t// value {v}")
+        lines.append("};")
+        lines.append("")
+
+    lines += [
+        "#pragma pack( push, 8 )",
+        "/* Details for a single synthetic item",
+        "   spread over a block comment */",
+        f"struct Synth{i}Details_t",
+        "{",
+        f"\tSynthAlias{i}_t m_handle;",
+        "\tEResult m_eResult;\t\t\t\t\t\t// The result of the operation.",
+        f"\tESynth{i}Kind0 m_eKind;",
+        "\tchar m_rgchName[k_cchSynthNameMax];",
+        "\tuint32 m_unFlags;",
+        "\tbool m_bValid;",
+        "};",
+        "#pragma pack( pop )",
+        "",
+        "//-----------------------------------------------------------------------------",
+        f"// Purpose: synthetic interface {i}",
+        "//-----------------------------------------------------------------------------",
+        f"class ISteamSynth{i}",
+        "{",
+        "public:",
+    ]
+
+    for j in range(g_FunctionsPerInterface // 2):
+        callback = j % g_CallbacksPerInterface
+        lines += [
+            f"\t// Requests thing {j}, the result arrives in Synth{i}Result{callback}_t",
+            f"\tSTEAM_CALL_RESULT( Synth{i}Result{callback}_t )",
+            f"\tvirtual SteamAPICall_t RequestThing{j}( SynthHandle{i}_t hHandle, STEAM_OUT_STRING_COUNT( cchBuffer ) char *pchBuffer, uint32 cchBuffer ) = 0;",
+            "",
+            f"\tvirtual bool GetThing{j}( SynthAlias{i}_t hHandle, uint32 index, Synth{i}Details_t *pDetails, bool bIncludeChildren = false ) = 0;",
+            "",
+        ]
+
+    lines += [
+        "};",
+        "",
+        f'#define STEAMSYNTH{i}_INTERFACE_VERSION "SteamSynth{i}001"',
+        "",
+        "// callbacks",
+        "#if defined( VALVE_CALLBACK_PACK_SMALL )",
+        "#pragma pack( push, 4 )",
+        "#elif defined( VALVE_CALLBACK_PACK_LARGE )",
+        "#pragma pack( push, 8 )",
+        "#else",
+        "#error steam_api_common.h should define VALVE_CALLBACK_PACK_xxx",
+        "#endif",
+        "",
+    ]
+
+    for c in range(g_CallbacksPerInterface):
+        lines += [
+            "//-----------------------------------------------------------------------------",
+            f"// Purpose: result of RequestThing calls, variant {c}",
+            "//-----------------------------------------------------------------------------",
+            f"struct Synth{i}Result{c}_t",
+            "{",
+            f"\tenum {{ k_iCallback = k_iSteamSynthCallbacks + {i * 100 + c} }};",
+            "\tEResult m_eResult;",
+            f"\tSynthHandle{i}_t m_handle;",
+            "\tbool m_bCachedData; // indicates whether this data was retrieved from the local on-disk cache",
+            f"\tSynth{i}Details_t m_details;",
+            "\tuint64 m_ulTotal, m_ulDone;",
+            "};",
+            "",
+        ]
+
+    lines += [
+        "#pragma pack( pop )",
+        "",
+        "#pragma pack( push, 8 )",
+        f"STEAM_CALLBACK_BEGIN( Synth{i}Notification_t, k_iSteamSynthCallbacks + {i * 100 + 99} )",
+        f"\tSTEAM_CALLBACK_MEMBER( 0, SynthHandle{i}_t, m_handle )",
+        "\tSTEAM_CALLBACK_MEMBER_ARRAY( 1, char, m_rgchMessage, 128 )",
+        "STEAM_CALLBACK_END( 2 )",
+        "#pragma pack( pop )",
+        "",
+        f"#endif // {guard}",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def bench_phases(folder):
+    """Runs a full parse and returns (phase, seconds, lines, entities) for each phase in Parser.stats"""
+    # Silence the warnings the passes print, they would dominate the timings
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        parser = steamworksparser.Parser(folder)
+
+    stats = parser.stats
+    numentities = sum(stats.entities.values())
+    numtypedefs = stats.entities.get("typedefs", 0)
+    numstructs = stats.entities.get("structs", 0) + stats.entities.get("callbacks", 0)
+    counts = {
+        "read": (stats.lines, None),
+        "line_loop": (stats.lines, numentities),
+        "symbol_index": (None, numtypedefs + numstructs),
+        "typedef_layouts": (None, numtypedefs),
+        "struct_layouts": (None, numstructs),
+        "field_layouts": (None, numstructs),
+        "platform_aware_structs": (None, numstructs),
+    }
+
+    return [(phase, elapsed) + counts.get(phase, (None, None)) for phase, elapsed in stats.phaseTimes.items()]
+
+
+def bench_line_loop(folder, repeat=10):
+    """Times Parser.parse over every header in the folder, without the file reads or the cross-file passes"""
+    parser = steamworksparser.Parser.__new__(steamworksparser.Parser)
+    parser.begin(folder)
+
+    contents = []
+    for name in steamworksparser.list_header_files(folder):
+        contents.append((name, steamworksparser.read_header(os.path.join(folder, name))[0]))
+
+    numlines = sum(text.count("\n") for name, text in contents)
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for name, text in contents:
+            s = steamworksparser.ParserState(steamworksparser.SteamFile(name))
+            s.text = text
+            s.lines = steamworksparser.iter_lines(text)
+            parser.parse(s)
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return numlines, best
+
+
+def bench_memory(folder):
+    """Returns the peak and retained memory of a full parse, in bytes"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        tracemalloc.start()
+        parser = steamworksparser.Parser(folder)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return peak, retained
+
+
+def report(folder):
+    for phase, elapsed, numlines, numentities in bench_phases(folder):
+        line = f"  {phase:<24}{elapsed * 1000:>10.1f} ms"
+        if numlines:
+            line += f"{numlines / elapsed:>14,.0f} lines/sec"
+        if numentities:
+            line += f"{numentities / elapsed:>14,.0f} entities/sec"
+        print(line)
+
+    numlines, elapsed = bench_line_loop(folder, repeat=3)
+    print(f"  line loop best of 3: {elapsed / numlines * 1e6:.2f} us/line")
+
+    peak, retained = bench_memory(folder)
+    print(f"  memory: {peak / 2**20:.1f} MiB peak, {retained / 2**20:.1f} MiB retained by the parsed model")
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Measures parser throughput per phase")
+    argparser.add_argument("folder", nargs="?", help="path/to/steamworks_sdk/sdk/public/steam/, generates synthetic headers if omitted")
+    argparser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 100], help="synthetic corpus sizes, in multiples of the SDK")
+    args = argparser.parse_args()
+
+    if args.folder:
+        print(args.folder)
+        report(args.folder)
+        return
+
+    for scale in args.scale:
+        with tempfile.TemporaryDirectory() as folder:
+            generate_corpus(folder, scale)
+            print(f"synthetic SDK x{scale}")
+            report(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,25 @@
 import os
+import array
 import codecs
+import contextlib
 import copy
+import cProfile
+import hashlib
+import io
+import json
+import mmap
+import pickle
+import pstats
 import re
-from typing import Literal, Optional
-from functools import reduce
-import operator
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Literal
+
+# Headers at least this big are memory-mapped instead of read into a bytes object
+g_MmapThreshold = 64 * 1024
+
+# Bump this whenever the parsed model changes shape, it invalidates every on-disk cache
+g_ParserVersion = 14
 
 g_SkippedFiles = (
     "steam_api_flat.h", # Valve's C API
@@ -69,6 +84,23 @@ g_ArgAttribs = (
     "STEAM_OUT_STRUCT",
 )
 
+# Patterns used by the line parsers, compiled once
+g_SkippedLinesPattern = re.compile("|".join(re.escape(skip) for skip in g_SkippedLines))
+g_ConstantPattern = re.compile(r".*const\s+(.*)\s+(\w+)\s+=\s+(.*);$")
+g_EnumConstantPattern = re.compile(r"^enum { (.*) = (.*) };")
+g_EnumFieldPattern = re.compile(r"^(\w+,?)([ \t]*)=?([ \t]*)(.*)$")
+g_StructFieldPattern = re.compile(r"^([^=.]*\s\**)(\w+);$")
+g_StructArrayFieldPattern = re.compile(r"^(.*\s\*?)(\w+)\[\s*(\w+)?\s*\];$")
+g_StructMultiFieldPattern = re.compile(r"^(\s*\w+)\s*([\w,\s\[$*\d]*);$")
+g_CallbackMemberArrayPattern = re.compile(r"^STEAM_CALLBACK_MEMBER_ARRAY\(.*,\s+(.*?)\s*,\s*(\w*)\s*,\s*(\d*)\s*\)")
+g_CallbackMemberPattern = re.compile(r"^STEAM_CALLBACK_MEMBER\(.*,\s+(.*?)\s*,\s*(\w*)\[?(\d+)?\]?\s*\)")
+g_CallbackBeginPattern = re.compile(r"^STEAM_CALLBACK_BEGIN\(\s?(\w+),\s?(.*?)\s*\)")
+g_IncludePattern = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*["<]([^">]+)[">]', re.MULTILINE)
+# Names a header declares, found without parsing it: classes, structs, enums, callbacks, typedefs, defines and constants
+g_DeclarationPattern = re.compile(rb'^[ \t]*(?:(?:class|struct|enum)[ \t]+(\w+)\b(?![ \t]*;)|STEAM_CALLBACK_BEGIN\([ \t]*(\w+)|typedef[^;(\[]*?(\w+)[ \t]*;|#[ \t]*define[ \t]+(\w+)|(?:static[ \t]+)?const[^=;(]*?(\w+)[ \t]*=)', re.MULTILINE)
+g_IdentifierPattern = re.compile(r"[A-Za-z_]\w*")
+g_ExpressionTokenPattern = re.compile(r"\s*(?:(0[xX][0-9a-fA-F]+|\d+)[uUlL]*|([A-Za-z_]\w*)|(<<|>>|[-+*/%()~!&|^]))")
+
 g_GameServerInterfaces = (
     'isteamclient.h',
     #'isteamgameserver.h',
@@ -126,6 +158,12 @@ g_PrimitiveTypesLayout: dict[str, PrimitiveType] = {
 g_SpecialStucts = {
 }
 
+# Pack values structs without an explicit #pragma pack are laid out with.
+# VALVE_CALLBACK_PACK_LARGE (Windows) first, it is the default one.
+g_LayoutPacks = (8, 4)
+
+g_PointerSize = 8
+
 class Settings:
     warn_utf8bom = False
     warn_includeguardname = False
@@ -133,23 +171,114 @@ class Settings:
     print_unuseddefines = False
     print_skippedtypedefs = False
     fake_gameserver_interfaces = False
+    # Only remember where each comment is and parse it when it is first read, see LazyComment
+    lazy_comments = False
+    # Names of ParserStats phases to run under cProfile, each one is dumped to profile_dir/<phase>.prof
+    profile_phases = ()
+    profile_dir = "."
+    # Print the collected diagnostics once the parse is done, see Diagnostics
+    print_diagnostics = True
+    # Keep at most this many distinct diagnostics, None keeps all of them
+    max_diagnostics = None
+
+# Settings that do not change what gets parsed, so they are left out of the cache key
+g_UncachedSettings = ("profile_phases", "profile_dir", "print_diagnostics")
+
+# The classes below are created tens of thousands of times per SDK, so they use __slots__
 
 class BlankLine(object):
-    pass # linenum?
+    __slots__ = () # linenum?
 
 class Comment:
+    __slots__ = ("rawprecomments", "precomments", "rawlinecomment", "linecomment")
+
     def __init__(self, rawcomments, comments, rawlinecomment, linecomment):
         self.rawprecomments = rawcomments
         self.precomments = comments
         self.rawlinecomment = rawlinecomment
         self.linecomment = linecomment
 
+class LazyComment:
+    """Stands in for a Comment, only remembers the span of header text it came from and parses it on first access"""
+    __slots__ = ("text", "start", "end", "bInMultilineComment", "headerpos", "values")
+
+    def __init__(self, text, start, end, bInMultilineComment, headerpos):
+        self.text = text  # the whole file, shared with every other comment of it
+        self.start = start
+        self.end = end
+        self.bInMultilineComment = bInMultilineComment  # state before the first line
+        self.headerpos = headerpos  # start of the line where the file header took the comments so far, or -1
+        self.values = None
+
+    def materialize(self):
+        if self.values is None:
+            # Replays the comment handling of Parser.parse over our lines
+            s = ParserState(None)
+            s.bLazyComments = False
+            s.bInMultilineComment = self.bInMultilineComment
+            parser = Parser.__new__(Parser)
+
+            pos = self.start
+            while pos < self.end:
+                lineend = self.text.find("\n", pos, self.end) + 1 or self.end
+                s.originalline = self.text[pos:lineend]
+                s.line = s.originalline.rstrip()
+                parser.parse_comments(s)
+                if pos == self.headerpos:
+                    s.comments = []
+                pos = lineend
+
+            self.values = [s.rawcomments, s.comments, s.rawlinecomment, s.linecomment]
+
+        return self.values
+
+    def __reduce__(self):
+        if self.values is not None:
+            return (Comment, tuple(self.values))
+        return (LazyComment, (self.text, self.start, self.end, self.bInMultilineComment, self.headerpos))
+
+    @property
+    def rawprecomments(self):
+        return self.materialize()[0]
+
+    @rawprecomments.setter
+    def rawprecomments(self, value):
+        self.materialize()[0] = value
+
+    @property
+    def precomments(self):
+        return self.materialize()[1]
+
+    @precomments.setter
+    def precomments(self, value):
+        self.materialize()[1] = value
+
+    @property
+    def rawlinecomment(self):
+        return self.materialize()[2]
+
+    @rawlinecomment.setter
+    def rawlinecomment(self, value):
+        self.materialize()[2] = value
+
+    @property
+    def linecomment(self):
+        return self.materialize()[3]
+
+    @linecomment.setter
+    def linecomment(self, value):
+        self.materialize()[3] = value
+
 class ArgAttribute:
+    __slots__ = ("name", "value")
+
     def __init__(self, name="", value=""):
         self.name = name
         self.value = value
 
 class Arg:
+    __slots__ = ("name", "type", "default", "attribute")
+
     def __init__(self, name="", type_="", default=None, attribute=None):
         self.name = name
         self.type = type_
@@ -157,42 +286,103 @@ class Arg:
         self.attribute = attribute  # ArgAttribute
 
 class FunctionAttribute:
+    __slots__ = ("name", "value")
+
     def __init__(self):
         self.name = ""
         self.value = ""
 
 class Function:
+    __slots__ = ("name", "returntype", "args", "ifstatements", "c", "attributes", "private")
+
     def __init__(self):
         self.name = ""
         self.returntype = ""
         self.args = []  # Arg
         self.ifstatements = []
-        self.comments = []
-        self.linecomment = ""
+        self.c = Comment([], [], None, "")  # Comment or LazyComment, read through comments and linecomment
         self.attributes = []  # FunctionAttribute
         self.private = False
 
+    @property
+    def comments(self):
+        return self.c.precomments
+
+    @comments.setter
+    def comments(self, value):
+        self.c.precomments = value
+
+    @property
+    def linecomment(self):
+        return self.c.linecomment
+
+    @linecomment.setter
+    def linecomment(self, value):
+        self.c.linecomment = value
+
 class Interface:
     def __init__(self):
         self.name = ""
         self.functions = []  # Function
         self.c = None  # Comment
 
+class GameServerInterface(Interface):
+    """The ISteamGameServer version of an ISteam interface, only the name is its own
+
+    The functions and comments are the original interface's objects. Assigning to functions or c,
+    or calling detach() first, gives this interface its own copy and leaves the original alone."""
+
+    def __init__(self, base: Interface):
+        self.base = base
+        self.name = base.name.replace("ISteam", "ISteamGameServer", 1)
+        self.overrides = {}  # attribute -> value this interface no longer shares with base
+
+    def detach(self):
+        """Copies the shared functions and comments, call this before changing them in place"""
+        for name in ("functions", "c"):
+            if name not in self.overrides:
+                self.overrides[name] = copy.deepcopy(getattr(self.base, name))
+        return self
+
+    @property
+    def functions(self):
+        return self.overrides.get("functions", self.base.functions)
+
+    @functions.setter
+    def functions(self, value):
+        self.overrides["functions"] = value
+
+    @property
+    def c(self):
+        return self.overrides.get("c", self.base.c)
+
+    @c.setter
+    def c(self, value):
+        self.overrides["c"] = value
+
 class Define:
-    def __init__(self, name, value, spacing, comments):
+    __slots__ = ("name", "value", "spacing", "c", "expression")
+
+    def __init__(self, name, value, spacing, comments, expression=None):
         self.name = name
-        self.value = value
+        self.value = value  # first token of the value only
         self.spacing = spacing
         self.c = comments
+        self.expression = value if expression is None else expression  # whole value, what Parser.evaluate reads
 
 class Constant:
-    def __init__(self, name, value, type_, comments):
+    __slots__ = ("name", "value", "type", "c", "expression")
+
+    def __init__(self, name, value, type_, comments, expression=None):
         self.name = name
         self.value = value
         self.type = type_
         self.c = comments  # Comment
+        self.expression = value if expression is None else expression  # whole value, what Parser.evaluate reads
 
 class EnumField:
+    __slots__ = ("name", "value", "prespacing", "postspacing", "c")
+
     def __init__(self):
         self.name = ""
         self.value = ""
@@ -225,44 +415,11 @@ class Struct:
         self.endcomments = None  # Comment
         self.size: int | None = None
         self.packsize_aware = False
-        
-    def calculate_offsets(self, packOverride):
-        if not self.fields:
-            return []
-        
-        effective_struct_pack = packOverride if packOverride is not None else self.packsize
-        
-        result = []
-        current_offset = 0
-        
-        for field in self.fields:
-            effective_pack = field.pack
-            if effective_struct_pack > 0:
-                effective_pack = min(field.pack, effective_struct_pack)
-            
-            if effective_pack > 0:
-                padding = (effective_pack - (current_offset % effective_pack)) % effective_pack
-                current_offset += padding
-            
-             
-            field_total_size = field.size * field.arraysize or 1
-            
-            # store offset and total size into layout info
-            result.append(FieldOffset(field.name, current_offset, field_total_size))
-            
-            current_offset += field.size
-        
-        total_size = current_offset
-        if effective_struct_pack > 0:
-            padding = (effective_struct_pack - (total_size % effective_struct_pack)) % effective_struct_pack
-            total_size += padding
-            
-        self.size = total_size
-
-        return result
 
 
 class StructField:
+    __slots__ = ("name", "type", "arraysize", "c", "size", "pack")
+
     def __init__(self, name, typee, arraysize, comments):
         self.name = name
         self.type = typee
@@ -272,12 +429,21 @@ class StructField:
         self.pack: int = None 
 
 class FieldOffset:
-    def __init__(self, name: str, offset: int):
+    def __init__(self, name: str, offset: int, size: int = None):
         self.name = name
         self.offset = offset
+        self.size = size # total size, including every array element
     
     def __eq__(self, value):
-        return self.name == value.name and self.value == value.value
+        return self.name == value.name and self.offset == value.offset and self.size == value.size
+
+class StructLayout:
+    def __init__(self, name: str, pack: int, size: int | None, align: int | None, fields: list[FieldOffset]):
+        self.name = name
+        self.pack = pack # pack used for structs without an explicit #pragma pack
+        self.size = size # None if some field type could not be resolved
+        self.align = align
+        self.fields = fields
 
 #init special struct
 
@@ -295,6 +461,8 @@ def init_special_structs():
 init_special_structs()
 
 class Typedef:
+    __slots__ = ("name", "type", "filename", "c", "size", "pack")
+
     def __init__(self, name, typee, filename, comments, size, pack):
         self.name = name
         self.type = typee
@@ -328,10 +496,20 @@ class ParserState:
         self.comments = []
         self.rawlinecomment = None
         self.linecomment = None
+        # Pending comment span for Settings.lazy_comments, nothing is stored in the lists above then
+        self.bLazyComments = Settings.lazy_comments
+        self.text = ""
+        self.linestart = 0
+        self.lineend = 0
+        self.commentstart = 0
+        self.bCommentStartInMultiline = False
+        self.headerpos = -1
         self.ifstatements = []
         self.packsize = []
+        self.callbackPackDepth = None  # depth of the VALVE_CALLBACK_PACK #if that already pushed its pack
         self.funcState = 0
         self.scopeDepth = 0
+        self.nestedStructDepth = None  # scope depth of the body of a struct nested in s.struct
 
         self.interface: Interface = None
         self.function: Function = None
@@ -346,57 +524,584 @@ class ParserState:
         self.callbackid = None
         self.functionAttributes: list[FunctionAttribute] = [] # FunctionAttribute
 
+class ParserStats:
+    """Wall time per phase and per file, plus counters, collected while parsing"""
+
+    def __init__(self):
+        self.phaseTimes: dict[str, float] = {}  # phase -> wall seconds in this process, summed over every run of the phase
+        self.workerPhaseTimes: dict[str, float] = {}  # phase -> seconds summed over every worker process, they overlap
+        self.fileTimes: dict[str, float] = {}  # file name -> seconds spent reading and parsing it
+        self.lines = 0
+        self.entities: dict[str, int] = {}  # kind -> number created
+        self.typeResolveCalls = 0
+        self.typeResolveCacheHits = 0
+        self.profilers: dict[str, cProfile.Profile] = {}  # phase -> profiler, enabled around every run of the phase
+        self.workerProfiles: dict[str, list[dict]] = {}  # phase -> raw pstats data sent back by worker processes
+
+    def __getstate__(self):
+        # Profilers cannot be pickled, their data travels as the raw dict pstats reads
+        state = self.__dict__.copy()
+        state["profilers"] = {}
+        state["workerProfiles"] = {name: list(profiles) for name, profiles in self.workerProfiles.items()}
+        for name, profiler in self.profilers.items():
+            profiler.create_stats()
+            state["workerProfiles"].setdefault(name, []).append(profiler.stats)
+        return state
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        profiler = None
+        if name in Settings.profile_phases:
+            profiler = self.profilers.get(name)
+            if profiler is None:
+                profiler = self.profilers[name] = cProfile.Profile()
+            profiler.enable()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phaseTimes[name] = self.phaseTimes.get(name, 0.0) + time.perf_counter() - start
+
+            if profiler is not None:
+                profiler.disable()
+
+    def dump_profiles(self):
+        """Writes the profile of each phase in Settings.profile_phases to profile_dir/<phase>.prof"""
+        for name in set(self.profilers) | set(self.workerProfiles):
+            combined = pstats.Stats()
+            if name in self.profilers:
+                combined.add(self.profilers[name])
+            for raw in self.workerProfiles.get(name, ()):
+                worker = pstats.Stats()
+                worker.stats = raw
+                worker.get_top_level_stats()
+                combined.add(worker)
+
+            os.makedirs(Settings.profile_dir, exist_ok=True)
+            combined.dump_stats(os.path.join(Settings.profile_dir, name + ".prof"))
+
+    def add_file(self, f: SteamFile, elapsed, numlines):
+        self.fileTimes[f.name] = elapsed
+        self.lines += numlines
+        for kind, count in count_entities(f).items():
+            self.entities[kind] = self.entities.get(kind, 0) + count
+
+    def merge(self, other: "ParserStats"):
+        # Stats of a worker process, which only ran the per-file phases.
+        # Its phases ran alongside the other workers', so they are not wall time here.
+        for name, elapsed in other.phaseTimes.items():
+            self.workerPhaseTimes[name] = self.workerPhaseTimes.get(name, 0.0) + elapsed
+        for name, profiles in other.workerProfiles.items():
+            self.workerProfiles.setdefault(name, []).extend(profiles)
+        self.fileTimes.update(other.fileTimes)
+        self.lines += other.lines
+        for kind, count in other.entities.items():
+            self.entities[kind] = self.entities.get(kind, 0) + count
+        self.typeResolveCalls += other.typeResolveCalls
+        self.typeResolveCacheHits += other.typeResolveCacheHits
+
+    def summary(self):
+        lines = ["Phases:"]
+        for name, elapsed in self.phaseTimes.items():
+            lines.append(f"  {name:<24}{elapsed * 1000:10.1f} ms")
+        if self.workerPhaseTimes:
+            lines.append("Worker phases, summed over every worker:")
+            for name, elapsed in self.workerPhaseTimes.items():
+                lines.append(f"  {name:<24}{elapsed * 1000:10.1f} ms")
+
+        lines.append("Slowest files:")
+        for name, elapsed in sorted(self.fileTimes.items(), key=lambda item: item[1], reverse=True)[:10]:
+            lines.append(f"  {name:<40}{elapsed * 1000:10.1f} ms")
+
+        lines.append(f"Lines: {self.lines}")
+        lines.append("Entities: " + ", ".join(f"{kind} {count}" for kind, count in self.entities.items()))
+        lines.append(f"Type resolutions: {self.typeResolveCalls}, {self.typeResolveCacheHits} from cache")
+        return "\n".join(lines)
+
+
+class Diagnostic:
+    __slots__ = ("kind", "file", "line", "message", "text", "count")
+
+    def __init__(self, kind, file, line, message, text):
+        self.kind = kind  # "warning", "unhandled" or "info"
+        self.file = file  # None for the cross-file passes
+        self.line = line
+        self.message = message
+        self.text = text  # The source line, if any
+        self.count = 1  # How many times this exact diagnostic was reported
+
+    def __str__(self):
+        result = "[" + self.kind.upper() + "] " + self.message
+        if self.file is not None:
+            result += " - In File: " + self.file + " - On Line " + str(self.line) + " - " + self.text
+        if self.count > 1:
+            result += " (x" + str(self.count) + ")"
+        return result
+
+
+class Diagnostics:
+    """Collects the parser's warnings instead of printing each one as it happens"""
+
+    def __init__(self):
+        self.records: list[Diagnostic] = []
+        self.index: dict[tuple, Diagnostic] = {}
+        self.dropped = 0  # Diagnostics left out because of Settings.max_diagnostics
+        self.emitted = 0  # records before this were already printed by emit()
+
+    def add(self, kind, message, s=None):
+        if s is not None:
+            record = Diagnostic(kind, s.f.name, s.linenum, message, s.line)
+        else:
+            record = Diagnostic(kind, None, None, message, None)
+        self.merge((record,))
+
+    def merge(self, records):
+        # Also takes the records of a worker process, in the order it reported them
+        for record in records:
+            key = (record.kind, record.message, record.file, record.line, record.text)
+            existing = self.index.get(key)
+            if existing is not None:
+                existing.count += record.count
+            elif Settings.max_diagnostics is not None and len(self.records) >= Settings.max_diagnostics:
+                self.dropped += 1
+            else:
+                self.index[key] = record
+                self.records.append(record)
+
+    def summary(self):
+        counts = {}
+        repeats = 0
+        for record in self.records:
+            counts[record.kind] = counts.get(record.kind, 0) + 1
+            repeats += record.count - 1
+
+        result = ", ".join(f"{count} {kind}" for kind, count in counts.items()) or "no diagnostics"
+        if repeats:
+            result += f", {repeats} repeats folded"
+        if self.dropped:
+            result += f", {self.dropped} dropped over the limit of {Settings.max_diagnostics}"
+        return result
+
+    def emit(self):
+        """Prints every diagnostic that was not printed yet, followed by a one line summary"""
+        records = self.records[self.emitted:]
+        self.emitted = len(self.records)
+        if not records:
+            return
+
+        print("\n".join(str(record) for record in records))
+        print("Diagnostics: " + self.summary())
+
+
+class QueryIndex:
+    """Functions and args of every interface, keyed by what Parser.find_functions and Parser.find_args look them up by"""
+
+    def __init__(self, files):
+        self.functions: list[tuple[Interface, Function]] = []
+        self.functionsByName: dict[str, list[tuple[Interface, Function]]] = {}
+        self.functionsByReturnType: dict[str, list[tuple[Interface, Function]]] = {}
+        self.functionsByArgType: dict[str, list[tuple[Interface, Function]]] = {}
+        self.functionsByAttribute: dict[str, list[tuple[Interface, Function]]] = {}
+        self.args: list[tuple[Interface, Function, Arg]] = []
+        self.argsByType: dict[str, list[tuple[Interface, Function, Arg]]] = {}
+        self.argsByAttribute: dict[str, list[tuple[Interface, Function, Arg]]] = {}
+
+        for f in files:
+            for interface in f.interfaces:
+                for function in interface.functions:
+                    entry = (interface, function)
+                    self.functions.append(entry)
+                    self.functionsByName.setdefault(function.name, []).append(entry)
+                    self.functionsByReturnType.setdefault(function.returntype, []).append(entry)
+                    for attribute in function.attributes:
+                        add_unique(self.functionsByAttribute, attribute.name, entry)
+
+                    for arg in function.args:
+                        argentry = (interface, function, arg)
+                        self.args.append(argentry)
+                        self.argsByType.setdefault(arg.type, []).append(argentry)
+                        add_unique(self.functionsByArgType, arg.type, entry)
+                        if arg.attribute:
+                            self.argsByAttribute.setdefault(arg.attribute.name, []).append(argentry)
+
+
+def add_unique(index, key, entry):
+    # A function taking two args of one type is listed once, they are added one after the other
+    entries = index.setdefault(key, [])
+    if not entries or entries[-1] is not entry:
+        entries.append(entry)
+
+
+def intersect_entries(lists):
+    # Keeps the order of the shortest list, the others are only checked for membership
+    lists = sorted(lists, key=len)
+    others = [{tuple(map(id, entry)) for entry in entries} for entries in lists[1:]]
+    return [entry for entry in lists[0] if all(tuple(map(id, entry)) in other for other in others)]
+
+
 class Parser:
     files = None
     typedefs = []
 
-    def __init__(self, folder):
-        self.files: list[SteamFile] = [SteamFile(f) for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f)) and f.endswith(".h") and f not in g_SkippedFiles]
-        self.files
-        self.files.sort(key=lambda f: f.name)
+    def __init__(self, folder, jobs=None, only=None):
+        self.begin(folder)
+        for f in self.iter_files(jobs, only):
+            pass
+        self.finish()
+
+    def begin(self, folder):
+        self.folder = folder
+        self.stats = ParserStats()
+        self.diagnostics = Diagnostics()
+        self.queryIndex: QueryIndex | None = None  # Built by the first query
+        self.files: list[SteamFile] = []
+        self.typedefs: list[Typedef] = []
+
+    def iter_files(self, jobs=None, only=None):
+        """Parses the headers one at a time, yielding each SteamFile as soon as its lines are parsed
+
+        If only is given, a list of interface, struct or file names, just the headers defining
+        those and everything they need are parsed."""
+        # Included headers first, so a streaming consumer has seen the types a file uses before the file itself
+        with self.stats.phase("include_order"):
+            if only is None:
+                names = get_include_order(self.folder, list_header_files(self.folder))
+            else:
+                scans = {name: scan_header(os.path.join(self.folder, name)) for name in list_header_files(self.folder)}
+                names = self.select_files(only, scans)
 
-        self.typedefs:list[Typedef] = []
+        while names:
+            if jobs is not None and jobs != 1 and len(names) > 1:
+                files = self.iter_files_parallel(names, jobs)
+            else:
+                files = (self.parse_file(SteamFile(name)) for name in names)
+
+            for f in files:
+                self.files.append(f)
+                self.typedefs.extend(f.typedefs)
+                yield f
+
+            names = []
+            if only is not None:
+                with self.stats.phase("include_order"):
+                    names = self.find_missing_files(scans)
+
+    def select_files(self, only, scans):
+        """Returns the headers defining the given names or named by them, with their includes, in include order"""
+        declaredBy = get_declaring_files(scans)
+        selected = []
+        for name in only:
+            if name in scans:
+                selected.append(name)
+            elif name in declaredBy:
+                selected.extend(declaredBy[name])
+            else:
+                self.diagnostics.add("warning", f"\"{name}\" is neither a header nor declared in one")
 
+        return get_include_order(self.folder, get_include_closure(selected, scans), {name: scan[0] for name, scan in scans.items()})
 
+    def find_missing_files(self, scans):
+        """Returns the headers declaring the types and constants the parsed files use but do not declare themselves"""
+        declared = set(g_PrimitiveTypesLayout)
+        used = set()
         for f in self.files:
-            s = ParserState(f)
-            filepath = os.path.join(folder, f.name)
-            with open(filepath, 'r', encoding="latin-1") as infile:
-                s.lines = infile.readlines()
-
-                if s.lines[0][:3] == codecs.BOM_UTF8:
-                    # Reload file with UTF-8 encoding
-                    infile.close()
-                    infile = open(filepath, 'r', encoding="utf-8")
-                    s.lines = infile.readlines()
-                    s.lines[0] = s.lines[0][3:]
-                    
-                    if Settings.warn_utf8bom:
-                        printWarning("File contains a UTF8 BOM.", s)
-
-                self.parse(s)
-                
-        
-        self.populate_typedef_layouts()
-        self.populate_struct_field_layout()
-        self.findout_platform_aware_structs()
+            declared.update(get_declared_type_names(f))
+            declared.update(get_declared_constant_names(f))
+
+            used.update(get_base_type_name(typedef.type) for typedef in f.typedefs)
+            used.update(g_IdentifierPattern.findall(" ".join(constant.value for constant in f.constants)))
+            used.update(g_IdentifierPattern.findall(" ".join(field.value for enum in f.enums for field in enum.fields)))
+            for struct in f.structs + f.callbacks:
+                used.update(get_base_type_name(field.type) for field in struct.fields)
+                used.update(get_base_type_name(field.type) for nested in struct.nested_struct for field in nested.fields)
+                used.update(g_IdentifierPattern.findall(" ".join(field.arraysize for field in struct.fields if field.arraysize)))
+                if struct.callbackid:
+                    used.update(g_IdentifierPattern.findall(struct.callbackid))
+            for interface in f.interfaces:
+                for function in interface.functions:
+                    used.add(get_base_type_name(function.returntype))
+                    used.update(get_base_type_name(arg.type) for arg in function.args)
+
+        declaredBy = get_declaring_files(scans)
+        parsed = {f.name for f in self.files}
+        missing = []
+        for name in sorted(used - declared):
+            missing.extend(filename for filename in declaredBy.get(name, ()) if filename not in parsed)
+        if not missing:
+            return []
 
+        closure = [name for name in get_include_closure(missing, scans) if name not in parsed]
+        return get_include_order(self.folder, closure, {name: scan[0] for name, scan in scans.items()})
+
+    def finish(self):
+        """Runs the cross-file passes once every file has been parsed"""
+        for phase in self.iter_finish():
+            pass
+        self.report()
 
+    def iter_finish(self):
+        """Runs the cross-file passes one at a time, yielding the name of each phase once it is done"""
+        # The model keeps the files sorted by name whatever order they were parsed in
+        self.files.sort(key=lambda f: f.name)
+        self.typedefs = [typedef for f in self.files for typedef in f.typedefs]
+
+        phases = [
+            ("symbol_index", self.build_symbol_index),
+            ("constants", self.evaluate_constants),
+            ("typedef_layouts", self.populate_typedef_layouts),
+            ("struct_layouts", self.populate_struct_layouts),
+            ("field_layouts", self.populate_struct_field_layout),
+            ("platform_aware_structs", self.findout_platform_aware_structs),
+        ]
         # Hack to give us the GameServer interfaces.
         # We want this for autogen but probably don't want it for anything else.
+        if Settings.fake_gameserver_interfaces:
+            phases.append(("gameserver_interfaces", self.add_gameserver_files))
+
+        for name, run in phases:
+            with self.stats.phase(name):
+                run()
+            yield name
+
+    def report(self):
+        """Prints the diagnostics and writes the profiles once the passes are done"""
+        if Settings.print_diagnostics:
+            self.diagnostics.emit()
+        self.stats.dump_profiles()
+
+    def parse_file(self, f: SteamFile):
+        start = time.perf_counter()
+        s = ParserState(f)
+        with self.stats.phase("read"):
+            s.text, bHasBOM = read_header(os.path.join(self.folder, f.name))
+        s.lines = iter_lines(s.text)
+
+        if bHasBOM and Settings.warn_utf8bom:
+            self.diagnostics.add("warning", "File contains a UTF8 BOM.", s)
+
+        with self.stats.phase("line_loop"):
+            self.parse(s)
+
+        # lineend only stays 0 for an empty file
+        self.stats.add_file(f, time.perf_counter() - start, s.linenum + 1 if s.lineend else 0)
+        return f
+
+    def iter_files_parallel(self, names, jobs):
+        # Each file only depends on its own ParserState, the global passes run after the merge
+        if jobs <= 0:
+            jobs = os.cpu_count() or 1
+
+        settings = get_settings()
+        chunksize = max(1, len(names) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # Only the time spent waiting on the workers, not the time the caller holds each file
+            with self.stats.phase("parallel_parse"):
+                # map() keeps the sorted input order, so the result is deterministic
+                results = executor.map(_parse_file_job, [self.folder] * len(names), names, [settings] * len(names), chunksize=chunksize)
+            while True:
+                with self.stats.phase("parallel_parse"):
+                    result = next(results, None)
+                    if result is None:
+                        executor.shutdown()
+                if result is None:
+                    break
+
+                f, stats, diagnostics = result
+                self.stats.merge(stats)
+                self.diagnostics.merge(diagnostics)
+                yield f
+
+    def add_gameserver_files(self):
+        for f in [f for f in self.files if f.name in g_GameServerInterfaces]:
+            self.files.append(self.make_gameserver_file(f))
+
+    def make_gameserver_file(self, f: SteamFile):
+        gs_f = SteamFile(f.name.replace("isteam", "isteamgameserver", 1))
+        gs_f.interfaces = [GameServerInterface(i) for i in f.interfaces]
+        return gs_f
+
+    def update(self, changed_paths):
+        """Reparses only the given headers and recomputes the layouts that could depend on them"""
+        changed = {os.path.basename(path) for path in changed_paths}
+        gameserver_names = {name.replace("isteam", "isteamgameserver", 1) for name in g_GameServerInterfaces}
+
+        # Every type and constant declared by a changed file, before and after the change
+        dirty_types = set()
+        dirty_constants = set()
+        oldfiles = {f.name: f for f in self.files if f.name not in gameserver_names}
+        for name in changed:
+            if name in oldfiles:
+                dirty_types.update(get_declared_type_names(oldfiles[name]))
+                dirty_constants.update(get_declared_constant_names(oldfiles[name]))
+
+        headers = set(list_header_files(self.folder))
+        newfiles = []
+        for name, f in oldfiles.items():
+            if name not in changed:
+                newfiles.append(f)
+        for name in changed:
+            if name in headers:
+                f = self.parse_file(SteamFile(name))
+                dirty_types.update(get_declared_type_names(f))
+                dirty_constants.update(get_declared_constant_names(f))
+                newfiles.append(f)
+        newfiles.sort(key=lambda f: f.name)
+
+        gameserver_files = {f.name: f for f in self.files if f.name in gameserver_names}
+        self.files = newfiles
         if Settings.fake_gameserver_interfaces:
             for f in [f for f in self.files if f.name in g_GameServerInterfaces]:
-                gs_f = SteamFile(f.name.replace("isteam", "isteamgameserver", 1))
-                gs_f.interfaces = copy.deepcopy(f.interfaces)
-                for i in gs_f.interfaces:
-                    i.name = i.name.replace("ISteam", "ISteamGameServer", 1)
-                self.files.append(gs_f)
+                gs_name = f.name.replace("isteam", "isteamgameserver", 1)
+                if f.name in changed or gs_name not in gameserver_files:
+                    self.files.append(self.make_gameserver_file(f))
+                else:
+                    self.files.append(gameserver_files[gs_name])
+
+        self.typedefs = [typedef for f in self.files for typedef in f.typedefs]
+        self.queryIndex = None
+        with self.stats.phase("symbol_index"):
+            self.build_symbol_index()
+        with self.stats.phase("constants"):
+            self.evaluate_constants()
+
+        # Typedefs and structs whose layout could change, propagated until nothing new is found
+        dirty_typedefs = [typedef for typedef in self.typedefs if typedef.filename in changed]
+        dirty_structs = [struct for f in self.files if f.name in changed for struct in f.callbacks + f.structs]
+        dirty_types.update(typedef.name for typedef in dirty_typedefs)
+        dirty_types.update(struct.name for struct in dirty_structs)
+
+        # Constants whose value uses a changed one, array sizes read these
+        bFoundNew = True
+        while bFoundNew:
+            bFoundNew = False
+            for name, dependencies in self.constantDependencies.items():
+                if name not in dirty_constants and any(dependency in dirty_constants for dependency in dependencies):
+                    dirty_constants.add(name)
+                    bFoundNew = True
+
+        bFoundNew = True
+        while bFoundNew:
+            bFoundNew = False
+            for typedef in self.typedefs:
+                if typedef.name not in dirty_types and typedef.type in dirty_types:
+                    dirty_typedefs.append(typedef)
+                    dirty_types.add(typedef.name)
+                    bFoundNew = True
+
+            for f in self.files:
+                for struct in f.callbacks + f.structs:
+                    if struct.name in dirty_types:
+                        continue
+                    if any(field.type in dirty_types or (field.arraysize and not dirty_constants.isdisjoint(g_IdentifierPattern.findall(field.arraysize)))
+                           for field in struct.fields):
+                        dirty_structs.append(struct)
+                        dirty_types.add(struct.name)
+                        bFoundNew = True
+
+        with self.stats.phase("typedef_layouts"):
+            self.populate_typedef_layouts(dirty_typedefs)
+        with self.stats.phase("struct_layouts"):
+            self.populate_struct_layouts(dirty_structs)
+        with self.stats.phase("field_layouts"):
+            self.populate_struct_field_layout(structs=dirty_structs)
+        with self.stats.phase("platform_aware_structs"):
+            self.findout_platform_aware_structs(dirty_structs)
+
+        self.report()
+
+    def get_query_index(self):
+        if self.queryIndex is None:
+            with self.stats.phase("query_index"):
+                self.queryIndex = QueryIndex(self.files)
+        return self.queryIndex
+
+    def find_functions(self, name=None, returntype=None, argtype=None, attribute=None):
+        """Returns the (interface, function) pairs matching every given filter
+
+        attribute is the name of a function attribute like STEAM_CALL_RESULT, argtype the exact
+        type of one of the args like "SteamAPICall_t" or "const char *"."""
+        index = self.get_query_index()
+        lists = []
+        if name is not None:
+            lists.append(index.functionsByName.get(name, []))
+        if returntype is not None:
+            lists.append(index.functionsByReturnType.get(returntype, []))
+        if argtype is not None:
+            lists.append(index.functionsByArgType.get(argtype, []))
+        if attribute is not None:
+            lists.append(index.functionsByAttribute.get(attribute, []))
+
+        if not lists:
+            return list(index.functions)
+        if len(lists) == 1:
+            return list(lists[0])
+        return intersect_entries(lists)
+
+    def find_args(self, type_=None, attribute=None):
+        """Returns the (interface, function, arg) triples matching every given filter
+
+        attribute is the name of an arg attribute like STEAM_OUT_STRING_COUNT."""
+        index = self.get_query_index()
+        lists = []
+        if type_ is not None:
+            lists.append(index.argsByType.get(type_, []))
+        if attribute is not None:
+            lists.append(index.argsByAttribute.get(attribute, []))
+
+        if not lists:
+            return list(index.args)
+        if len(lists) == 1:
+            return list(lists[0])
+        return intersect_entries(lists)
+
+    def save_cache(self, cachedir, key=None):
+        if key is None:
+            key = get_cache_key(self.folder)
+
+        os.makedirs(cachedir, exist_ok=True)
+        cachepath = os.path.join(cachedir, key + ".pickle")
+
+        # Write to a temporary file first so a concurrent reader never sees a partial cache
+        tmppath = cachepath + "." + str(os.getpid()) + ".tmp"
+        with open(tmppath, 'wb') as outfile:
+            pickle.dump(self, outfile, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmppath, cachepath)
+
+    @staticmethod
+    def load_cache(folder, cachedir, key=None):
+        if key is None:
+            key = get_cache_key(folder)
+
+        cachepath = os.path.join(cachedir, key + ".pickle")
+        if not os.path.isfile(cachepath):
+            return None
+
+        try:
+            with open(cachepath, 'rb') as infile:
+                parser = pickle.load(infile)
+        except Exception:
+            # Corrupt or stale cache, the caller will just parse again
+            return None
+
+        if not isinstance(parser, Parser):
+            return None
+
+        parser.folder = folder
+        return parser
 
     def parse(self, s: ParserState):
+        if s.bLazyComments and not s.text:
+            # LazyComments point into this instead of holding their own strings
+            s.lines = list(s.lines)
+            s.text = "".join(s.lines)
+
         for linenum, line in enumerate(s.lines):
             s.line = line
             s.originalline = line
             s.linenum = linenum
+            s.linestart = s.lineend
+            s.lineend += len(line)
 
             s.line = s.line.rstrip()
 
@@ -415,21 +1120,42 @@ class Parser:
                 self.consume_comments(s)
                 continue
 
-            self.parse_preprocessor(s)
-            self.parse_typedefs(s)
-            self.parse_constants(s)
-            self.parse_enums(s)
-            self.parse_structs(s)
-            self.parse_callbackmacros(s)
-            self.parse_interfaces(s)
+            # Only call the handlers that can act on this line, going by its first token and
+            # what we are currently inside of. The order matters, the handlers update s as they go.
+            firsttoken = s.linesplit[0]
+
+            if firsttoken[0] == "#":
+                self.parse_preprocessor(s)
+            elif firsttoken == "typedef":
+                self.parse_typedefs(s)
+            elif firsttoken == "const" or firsttoken == "static":
+                self.parse_constants(s)
+
+            if s.enum or firsttoken == "enum":
+                self.parse_enums(s)
+
+            if not s.enum and (s.struct or firsttoken == "struct"):
+                self.parse_structs(s)
+
+            if s.callbackmacro or firsttoken.startswith("STEAM_CALLBACK_BEGIN"):
+                self.parse_callbackmacros(s)
+
+            if s.interface or firsttoken == "class":
+                self.parse_interfaces(s)
+
             if not s.line:
                 continue
 
-            self.parse_classes(s)
-            self.parse_scope(s)
+            if s.linesplit[0] == "class":
+                self.parse_classes(s)
+
+            if "{" in s.line or "}" in s.line:
+                self.parse_scope(s)
 
     def parse_comments(self, s):
-        self.parse_comments_multiline(s)
+        # Most lines are not part of a multiline comment, don't scan them for one
+        if s.bInMultilineComment or "/*" in s.line:
+            self.parse_comments_multiline(s)
         self.parse_comments_singleline(s)
         s.line = s.line.strip()
 
@@ -463,7 +1189,7 @@ class Parser:
                 strComment = s.line
                 s.line = ""
 
-        if strComment is not None:
+        if strComment is not None and not s.bLazyComments:
             s.comments.append(strComment.rstrip())
 
         if multipleQuoteblocks:
@@ -477,12 +1203,15 @@ class Parser:
             s.linecomment = None
 
         if not s.line:
-            s.rawcomments.append(BlankLine())
+            if not s.bLazyComments:
+                s.rawcomments.append(BlankLine())
             return
 
         commentPos = s.line.find("//")
 
-        if commentPos != -1:
+        if commentPos != -1 and s.bLazyComments:
+            s.line = s.line[:commentPos]
+        elif commentPos != -1:
             s.linecomment = s.line[commentPos+2:]
             s.line = s.line[:commentPos]
 
@@ -493,8 +1222,12 @@ class Parser:
 
     def parse_header(self, s):
         if s.line:
-            s.f.header.extend(s.comments)
-            s.comments = []
+            if s.bLazyComments:
+                s.f.header.extend(LazyComment(s.text, s.commentstart, s.lineend, s.bCommentStartInMultiline, -1).precomments)
+                s.headerpos = s.linestart
+            else:
+                s.f.header.extend(s.comments)
+                s.comments = []
             s.bInHeader = False
 
     def parse_skippedlines(self, s):
@@ -520,9 +1253,8 @@ class Parser:
             s.bInMultilineMacro = False
             return True
 
-        for skip in g_SkippedLines:
-            if skip in s.line:
-                return True
+        if g_SkippedLinesPattern.search(s.line):
+            return True
 
         if not s.interface and 'inline' in s.line:
             return True
@@ -551,25 +1283,38 @@ class Parser:
         elif s.line.startswith("#if"):
             s.ifstatements.append(s.line[3:].strip())
         elif s.line.startswith("#endif"):
+            if s.callbackPackDepth == len(s.ifstatements):
+                s.callbackPackDepth = None
             s.ifstatements.pop()
         elif s.line.startswith("#define"):
             comments = self.consume_comments(s)
             if Settings.warn_includeguardname:
                 if not s.ifstatements:
                     if s.linesplit[1] != s.f.name.upper().replace(".", "_"):
-                        printWarning("Include guard does not match the file name.", s)
+                        self.diagnostics.add("warning", "Include guard does not match the file name.", s)
 
             if len(s.linesplit) > 2:
-                spacing = s.line[s.line.index(s.linesplit[1]) + len(s.linesplit[1]):s.line.index(s.linesplit[2])]
-                s.f.defines.append(Define(s.linesplit[1], s.linesplit[2], spacing, comments))
+                nameend = s.line.index(s.linesplit[1]) + len(s.linesplit[1])
+                spacing = s.line[nameend:s.line.index(s.linesplit[2])]
+                s.f.defines.append(Define(s.linesplit[1], s.linesplit[2], spacing, comments, s.line[nameend:].strip()))
             elif Settings.print_unuseddefines:
-                print("Unused Define: " + s.line)
+                self.diagnostics.add("info", "Unused Define", s)
         elif s.line.startswith("#pragma pack"):
             if "push" in s.line:
-                tmpline = s.line[s.line.index(",")+1:-1].strip()
-                s.packsize.append(int(tmpline))
+                if s.ifstatements and "VALVE_CALLBACK_PACK" in s.ifstatements[-1]:
+                    # Depends on the platform, see g_LayoutPacks
+                    # Only one branch of the #if is ever taken, and the block is followed by a single pop
+                    if s.callbackPackDepth != len(s.ifstatements):
+                        s.packsize.append(None)
+                        s.callbackPackDepth = len(s.ifstatements)
+                elif "," in s.line:
+                    tmpline = s.line[s.line.index(",")+1:-1].strip()
+                    s.packsize.append(int(tmpline))
+                else:
+                    s.packsize.append(s.packsize[-1] if s.packsize else None)
             elif "pop" in s.line:
-                s.packsize.pop
+                if s.packsize:
+                    s.packsize.pop()
         elif s.line.startswith("#pragma"):
             pass
         elif s.line.startswith("#error"):
@@ -581,7 +1326,7 @@ class Parser:
         elif s.line.startswith("#undef"):
             pass
         else:
-            printUnhandled("Preprocessor", s)
+            self.diagnostics.add("unhandled", "Preprocessor", s)
 
 
     def parse_typedefs(self, s):
@@ -593,19 +1338,19 @@ class Parser:
         # Skips typedefs in the Callback/CallResult classes
         if s.scopeDepth > 0:
             if Settings.print_skippedtypedefs:
-                print("Skipped typedef because it's in a class or struct: " + s.line)
+                self.diagnostics.add("info", "Skipped typedef because it's in a class or struct", s)
             return
 
         # Skips typedefs that we don't currently support, So far they are all function pointers.
         if "(" in s.line or "[" in s.line:
             if Settings.print_skippedtypedefs:
-                print("Skipped typedef because it contains '(' or '[': " + s.line)
+                self.diagnostics.add("info", "Skipped typedef because it contains '(' or '['", s)
             return
 
         # Currently skips typedef struct ValvePackingSentinel_t
         if not s.line.endswith(";"):
             if Settings.print_skippedtypedefs:
-                print("Skipped typedef because it does not end with ';': " + s.line)
+                self.diagnostics.add("info", "Skipped typedef because it does not end with ';'", s)
             return
 
         name = s.linesplit[-1].rstrip(";")
@@ -616,41 +1361,27 @@ class Parser:
 
         typedef = Typedef(name, typee, s.f.name, comments, None, None)
 
-        self.typedefs.append(typedef)
         s.f.typedefs.append(typedef)
 
-    def populate_typedef_layouts(self):
-        for typedef in self.typedefs:
+    def populate_typedef_layouts(self, typedefs=None):
+        if typedefs is None:
+            typedefs = self.typedefs
+
+        for typedef in typedefs:
             typee = typedef.type
             
             if typee in g_PrimitiveTypesLayout.keys():
                 primitive_def = g_PrimitiveTypesLayout[typee]
                 typedef.pack = primitive_def.pack
                 typedef.size = primitive_def.size
-                return
-
-            def resolveFinalType(typee):
-                underlying_type: PrimitiveType | Typedef | None = g_PrimitiveTypesLayout.get(typee)
-
-                if '*' in typee:
-                    return g_PrimitiveTypesLayout["intptr"]
-
-                if underlying_type == None:
-                    underlying_type = next((typedef for typedef in self.typedefs if typedef.name == typee), None)
-                
-                if underlying_type == None:
-                    # scan in steam interface files
-                    underlying_type = next([typedef for file in self.files for typedef in file["typedefs"]], None)
-
-                if underlying_type.name not in g_PrimitiveTypesLayout.keys():
-                    return resolveFinalType(underlying_type)
-                else:
-                    return underlying_type
+                continue
 
-            underlying_type = resolveFinalType(typee)
+            underlying_type = self.resolveFinalType(typee, typedef.filename)
 
             if underlying_type == None and '*' not in typee:
-                print(f"[WARNING] typedef \"{typedef.name}\"'s underlying type \"{typee}\" is not in primitive list")
+                self.diagnostics.add("warning", f"typedef \"{typedef.name}\"'s underlying type \"{typee}\" is not in primitive list")
+                size = None
+                pack = None
             # is pointer
             elif '*' in typee:
                 size = 'intptr'
@@ -677,7 +1408,7 @@ class Parser:
         if "=" not in s.linesplit:
             return
 
-        result = re.match(".*const\s+(.*)\s+(\w+)\s+=\s+(.*);$", s.line)
+        result = g_ConstantPattern.match(s.line)
 
         if not result:
             return
@@ -720,15 +1451,15 @@ class Parser:
             if s.linesplit[-1] == "\\":
                 return
 
+            result = g_EnumConstantPattern.match(s.line)
             if s.struct:
-                result = re.match("^enum { (.*) = (.*) };", s.line)
                 name = result.group(1)
 
                 if name == "k_iCallback":
                     s.callbackid = result.group(2)
                     return
 
-            constant = Constant(s.linesplit[2], s.linesplit[4], "int", comments);
+            constant = Constant(s.linesplit[2], s.linesplit[4], "int", comments, result.group(2) if result else None);
             s.f.constants.append(constant)
             return
 
@@ -744,7 +1475,7 @@ class Parser:
         s.enum = Enum(s.linesplit[1], comments)
 
     def parse_enumfields(self, s):
-        result = re.match("^(\w+,?)([ \t]*)=?([ \t]*)(.*)$", s.line)
+        result = g_EnumFieldPattern.match(s.line)
         comments = self.consume_comments(s)
 
         # HACK: This is a hack for multiline fields :(
@@ -778,6 +1509,12 @@ class Parser:
             return
 
         if s.struct:
+            if s.nestedStructDepth is not None:
+                # The scope is only updated after this line, so the closing line is still at the body's depth
+                if s.line.startswith("}") and s.scopeDepth == s.nestedStructDepth:
+                    s.nestedStructDepth = None
+                return
+
             if s.line == "};":
                 s.struct.endcomments = self.consume_comments(s)
 
@@ -787,13 +1524,12 @@ class Parser:
                     s.callbackid = None
                 else:
                     s.f.structs.append(s.struct)
-    
-				# restore current struct in parser state to outer struct
-                if s.scopeDepth != 1:
-                    currentStruct: Struct = s.struct
-                    s.struct = currentStruct.outerStruct
-                    
+
                 s.struct = None
+            elif s.linesplit[0] == "struct" and ("{" in s.line or not s.line.endswith(";")):
+                self.diagnostics.add("unhandled", "Nested struct, it and its fields are left out of the outer struct", s)
+                if "}" not in s.line:
+                    s.nestedStructDepth = s.scopeDepth + 1
             else:
                 self.parse_struct_fields(s)
 
@@ -813,8 +1549,7 @@ class Parser:
         if s.scopeDepth != 0:
             return
 
-        if s.struct.
-            s.struct = Struct(s.linesplit[1], s.packsize, comments)
+        s.struct = Struct(s.linesplit[1], s.packsize[-1] if s.packsize else None, comments)
 
     def parse_struct_fields(self, s):
         comments = self.consume_comments(s)
@@ -828,9 +1563,9 @@ class Parser:
         def try_match(line):
             fieldarraysize = None
         
-            result = re.match(r"^([^=.]*\s\**)(\w+);$", line)
+            result = g_StructFieldPattern.match(line)
             if result is None:
-                result = re.match(r"^(.*\s\*?)(\w+)\[\s*(\w+)?\s*\];$", line)
+                result = g_StructArrayFieldPattern.match(line)
                 if result is not None:
                     fieldarraysize = result.group(3)
                 else:
@@ -849,7 +1584,7 @@ class Parser:
             s.struct.fields.append(StructField(fieldname, fieldtype, fieldarraysize, comments))
         
         if ',' in s.line:
-            result = re.match(r"^(\s*\w+)\s*([\w,\s\[$*\d]*);$", s.line)
+            result = g_StructMultiFieldPattern.match(s.line)
             if not result: return
 
             
@@ -868,7 +1603,7 @@ class Parser:
                 s.f.callbacks.append(s.callbackmacro)
                 s.callbackmacro = None
             elif s.line.startswith("STEAM_CALLBACK_MEMBER_ARRAY"):
-                result = re.match("^STEAM_CALLBACK_MEMBER_ARRAY\(.*,\s+(.*?)\s*,\s*(\w*)\s*,\s*(\d*)\s*\)", s.line)
+                result = g_CallbackMemberArrayPattern.match(s.line)
 
                 fieldtype = result.group(1)
                 fieldname = result.group(2)
@@ -876,7 +1611,7 @@ class Parser:
 
                 s.callbackmacro.fields.append(StructField(fieldname, fieldtype, fieldarraysize, comments))
             elif s.line.startswith("STEAM_CALLBACK_MEMBER"):
-                result = re.match("^STEAM_CALLBACK_MEMBER\(.*,\s+(.*?)\s*,\s*(\w*)\[?(\d+)?\]?\s*\)", s.line)
+                result = g_CallbackMemberPattern.match(s.line)
 
                 fieldtype = result.group(1)
                 fieldname = result.group(2)
@@ -885,7 +1620,7 @@ class Parser:
                 s.callbackmacro.fields.append(StructField(fieldname, fieldtype, fieldarraysize, comments))
             
             else:
-                printWarning("Unexpected line in Callback Macro")
+                self.diagnostics.add("warning", "Unexpected line in Callback Macro", s)
 
             return
 
@@ -894,9 +1629,9 @@ class Parser:
 
         comments = self.consume_comments(s)
 
-        result = re.match("^STEAM_CALLBACK_BEGIN\(\s?(\w+),\s?(.*?)\s*\)", s.line)
+        result = g_CallbackBeginPattern.match(s.line)
 
-        s.callbackmacro = Struct(result.group(1), s.packsize, comments)
+        s.callbackmacro = Struct(result.group(1), s.packsize[-1] if s.packsize else None, comments)
         s.callbackmacro.callbackid = result.group(2)
 
     def parse_interfaces(self, s):
@@ -913,12 +1648,11 @@ class Parser:
             self.parse_interface_functions(s)
 
     def parse_interface_function_atrributes(self, s):
-        for a in g_FuncAttribs:
-            if s.line.startswith(a):
-                attr = FunctionAttribute()
-                attr.name = s.line[:s.line.index("(")]
-                attr.value = s.line[s.line.index("(")+1:s.line.rindex(")")].strip()
-                s.functionAttributes.append(attr)
+        if s.line.startswith(g_FuncAttribs):
+            attr = FunctionAttribute()
+            attr.name = s.line[:s.line.index("(")]
+            attr.value = s.line[s.line.index("(")+1:s.line.rindex(")")].strip()
+            s.functionAttributes.append(attr)
 
     def parse_interface_functions(self, s):
         self.parse_interface_function_atrributes(s)
@@ -949,12 +1683,11 @@ class Parser:
             s.function = Function()
             if len(s.ifstatements) > 1:
                 s.function.ifstatements = s.ifstatements[-1]
-            s.function.comments = s.comments
-            s.function.linecomment = s.linecomment
+            comments = self.consume_comments(s)
+            s.function.c = comments
             s.function.private = bInPrivate
             s.function.attributes = s.functionAttributes
             s.functionAttributes = []
-            self.consume_comments(s)
 
         linesplit_iter = iter(enumerate(s.linesplit))
         for i, token in linesplit_iter:
@@ -985,7 +1718,7 @@ class Parser:
                     break
                 elif token[-1] != "(":  # Like f(void arg )
                     if Settings.warn_spacing:
-                        printWarning("Function is missing whitespace between the opening parentheses and first arg.", s)
+                        self.diagnostics.add("warning", "Function is missing whitespace between the opening parentheses and first arg.", s)
                     token = token.split("(")[1]
                     s.funcState = 2
                 else:
@@ -994,13 +1727,8 @@ class Parser:
 
             if s.funcState == 2:  # Args
                 # Strip clang attributes
-                bIsAttrib = False
-                for a in g_ArgAttribs:
-                    if token.startswith(a):
-                        attr = ArgAttribute()
-                        bIsAttrib = True
-                        break
-                if bIsAttrib:
+                if token.startswith(g_ArgAttribs):
+                    attr = ArgAttribute()
                     openparen_index = token.index("(")
                     attr.name = token[:openparen_index]
                     if len(token) > openparen_index+1:
@@ -1043,7 +1771,7 @@ class Parser:
                     s.funcState = 3
                 elif token.endswith(")"):  # Like f( void "arg)"
                     if Settings.warn_spacing:
-                        printWarning("Function is missing whitespace between the closing parentheses and first arg.", s)
+                        self.diagnostics.add("warning", "Function is missing whitespace between the closing parentheses and first arg.", s)
 
                     arg = Arg()
                     arg.type = args.strip()
@@ -1119,7 +1847,7 @@ class Parser:
             s.scopeDepth += 1
 
             if s.line.count("{") > 1:
-                printWarning("Multiple occurences of '{'", s)
+                self.diagnostics.add("warning", "Multiple occurences of '{'", s)
 
         if "}" in s.line:
             s.scopeDepth -= 1
@@ -1129,12 +1857,19 @@ class Parser:
                 s.interface = None
 
             if s.scopeDepth < 0:
-                printWarning("scopeDepth is less than 0!", s)
+                self.diagnostics.add("warning", "scopeDepth is less than 0!", s)
 
             if s.line.count("}") > 1:
-                printWarning("Multiple occurences of '}'", s)
+                self.diagnostics.add("warning", "Multiple occurences of '}'", s)
 
     def consume_comments(self, s):
+        if s.bLazyComments:
+            c = LazyComment(s.text, s.commentstart, s.lineend, s.bCommentStartInMultiline, s.headerpos)
+            s.commentstart = s.lineend
+            s.bCommentStartInMultiline = s.bInMultilineComment
+            s.headerpos = -1
+            return c
+
         c = Comment(s.rawcomments, s.comments, s.rawlinecomment, s.linecomment)
         s.rawcomments = []
         s.comments = []
@@ -1142,95 +1877,1752 @@ class Parser:
         s.linecomment = None
         return c
     
-    def resolveTypeInfo(self, typeName):
-        # search order: primitive, pointer, enum, typedef, struct. no callbacks
-        result = g_PrimitiveTypesLayout.get(typeName)
-        
-        if not result and '*' in typeName:
+    def build_symbol_index(self):
+        self.build_include_graph()
+
+        # search order: primitive, typedef, enum, struct, callback. The first definition of a name wins,
+        # unless resolve_symbol is asked from a file that only includes one of the others
+        self.symbolDefinitions: dict[str, list[tuple[str, Typedef | Enum | Struct]]] = {}
+        self.structFiles: dict[Struct, str] = {}  # struct -> name of the file it is in
+
+        for typedef in self.typedefs:
+            self.symbolDefinitions.setdefault(typedef.name, []).append((typedef.filename, typedef))
+
+        for f in self.files:
+            for enum in f.enums:
+                self.symbolDefinitions.setdefault(enum.name, []).append((f.name, enum))
+
+        for f in self.files:
+            for struct in f.structs:
+                self.symbolDefinitions.setdefault(struct.name, []).append((f.name, struct))
+                self.structFiles[struct] = f.name
+
+        for f in self.files:
+            for struct in f.callbacks:
+                self.symbolDefinitions.setdefault(struct.name, []).append((f.name, struct))
+                self.structFiles[struct] = f.name
+
+        self.symbols: dict[str, PrimitiveType | Typedef | Enum | Struct] = dict(g_PrimitiveTypesLayout)
+        for name, definitions in self.symbolDefinitions.items():
+            self.symbols.setdefault(name, definitions[0][1])
+
+        self.build_type_dependencies()
+
+        # Expressions of every constant, define and enum field, evaluated on demand by evaluate_constant
+        self.constantExpressions: dict[str, str] = {}
+        for f in self.files:
+            for constant in f.constants:
+                self.constantExpressions.setdefault(constant.name, constant.expression)
+            for define in f.defines:
+                self.constantExpressions.setdefault(define.name, define.expression)
+            for enum in f.enums:
+                lastExplicit = None
+                implicit = 0
+                for field in enum.fields:
+                    # Fields without a value keep their trailing comma in the name
+                    name = field.name.rstrip(",")
+                    value = field.value.rstrip(",").strip()
+                    if value and value != "=":
+                        lastExplicit = name
+                        implicit = 0
+                    else:
+                        # Counts up from the last field with a value, so long enums don't make deep chains
+                        implicit += 1
+                        value = lastExplicit + " + " + str(implicit) if lastExplicit else str(implicit - 1)
+                    self.constantExpressions.setdefault(name, value)
+
+        self.constantValues: dict[str, int | None] = {}  # name -> value, None if it could not be evaluated
+        self.constantErrors: dict[str, ConstantExpressionError] = {}
+        self.constantDependencies: dict[str, list[str]] = {}  # name -> the constants its expression uses
+        self.evaluating: list[str] = []
+
+        # (typedef name, using file) -> PrimitiveType at the end of its typedef chain
+        self.finalTypes: dict[tuple[str, str | None], PrimitiveType | None] = {}
+        # (type name, using file) -> what resolveTypeInfo returned for it
+        self.typeInfos: dict[tuple[str, str | None], object] = {}
+
+    def build_include_graph(self):
+        """Records which of the parsed files each file includes, directly and through other files"""
+        names = {f.name for f in self.files}
+
+        # file name -> the parsed files it includes, headers outside the folder are left out
+        self.includeGraph: dict[str, list[str]] = {}
+        for f in self.files:
+            self.includeGraph[f.name] = [os.path.basename(name) for name in f.includes if os.path.basename(name) in names]
+
+        # file name -> the file itself and everything it includes transitively
+        self.includeClosures: dict[str, frozenset[str]] = {}
+        for name in self.includeGraph:
+            closure = {name}
+            pending = [name]
+            while pending:
+                for include in self.includeGraph[pending.pop()]:
+                    if include not in closure:
+                        closure.add(include)
+                        pending.append(include)
+            self.includeClosures[name] = frozenset(closure)
+
+    def build_type_dependencies(self):
+        """Records for each file which other files the types it uses resolve into"""
+        self.typeDependencies: dict[str, list[str]] = {}
+        for f in self.files:
+            typeNames = [typedef.type for typedef in f.typedefs]
+            for struct in f.structs + f.callbacks:
+                typeNames.extend(field.type for field in struct.fields)
+            for interface in f.interfaces:
+                for function in interface.functions:
+                    typeNames.append(function.returntype)
+                    typeNames.extend(arg.type for arg in function.args)
+
+            files = set()
+            for typeName in set(typeNames):
+                definition = self.resolve_symbol_definition(get_base_type_name(typeName), f.name)
+                if definition is not None and definition[0] != f.name:
+                    files.add(definition[0])
+            self.typeDependencies[f.name] = sorted(files)
+
+    def resolve_symbol_definition(self, typeName, filename=None):
+        definitions = self.symbolDefinitions.get(typeName)
+        if not definitions:
+            return None
+        if len(definitions) > 1 and filename is not None:
+            # Only names defined in several files need the include closure, the rest has a single answer
+            closure = self.includeClosures.get(filename, ())
+            for definition in definitions:
+                if definition[0] in closure:
+                    return definition
+        return definitions[0]
+
+    def resolve_symbol(self, typeName, filename=None):
+        """Looks up a typedef, enum or struct, preferring the definition the file can see through its includes"""
+        definition = self.resolve_symbol_definition(typeName, filename)
+        return definition[1] if definition is not None else g_PrimitiveTypesLayout.get(typeName)
+
+    def resolveFinalType(self, typeName, filename=None):
+        self.stats.typeResolveCalls += 1
+        if '*' in typeName:
             return g_PrimitiveTypesLayout["intptr"]
-        
-        if not result:
-            result = next((typedef for typedef in self.typedefs if typedef.name == typeName), None)
 
-        if not result:
-            # see structs
-            allenums = reduce(operator.concat, [f.enums for f in self.files ])
-            result = next((enum for enum in allenums if enum.name == typeName), None)
-        
-        if not result:
-            # see structs
-            allenums = reduce(operator.concat, [f.structs for f in self.files ])
-            result = next((struct for struct in allenums if struct.name == typeName), None)
+        key = (typeName, filename)
+        if key in self.finalTypes:
+            self.stats.typeResolveCacheHits += 1
+            return self.finalTypes[key]
+
+        # Guards against typedef cycles
+        self.finalTypes[key] = None
+
+        # Each link of the chain is looked up from the file that typedef is in
+        result = self.resolve_symbol(typeName, filename)
+        if isinstance(result, Typedef):
+            result = self.resolveFinalType(result.type, result.filename)
+        elif not isinstance(result, PrimitiveType):
+            result = None
 
+        self.finalTypes[key] = result
+        return result
+
+    def resolveTypeInfo(self, typeName, filename=None):
+        # search order: primitive, pointer, typedef, enum, struct, callback
+        self.stats.typeResolveCalls += 1
+        key = (typeName, filename)
+        if key in self.typeInfos:
+            self.stats.typeResolveCacheHits += 1
+            result = self.typeInfos[key]
+        else:
+            result = g_PrimitiveTypesLayout.get(typeName)
+
+            if not result and '*' in typeName:
+                result = g_PrimitiveTypesLayout["intptr"]
+
+            if not result:
+                result = self.resolve_symbol(typeName, filename)
+            self.typeInfos[key] = result
 
         if not result:
-            print(f"[WARNING] typename {typeName} not found across primitive,\
+            self.diagnostics.add("warning", f"typename {typeName} not found across primitive,\
  struct and typedef, maybe it is a nested type.")
         
         return result
 
-    def populate_struct_field_layout(self, defaultPack = 8):
-        for file in self.files:
-            structs: list[Struct] = []
-            structs.extend(file.callbacks)
-            structs.extend(file.structs)
-
-            def populate_struct(struct: Struct, defaultPack:Optional[int] = None):
-                for field in struct.fields:
-                    typeinfo = self.resolveTypeInfo(field.type)
-                    # check if we facing a struct which may not populated yet
-                    if isinstance(typeinfo, Struct):
-                        struct = typeinfo
-                        
-                        if not struct.packsize:
-                            struct.packsize = defaultPack
-                        
-                        # we assume there will no circular references across structs
-                        populate_struct(typeinfo)
-                        
-                    field.size = typeinfo.size
-                    field.pack = typeinfo.pack or defaultPack
-            
-            for struct in structs:
-                populate_struct(struct, defaultPack)
+    def sort_structs_by_dependency(self):
+        """Orders every struct and callback so that the structs used by its fields come first"""
+        order: list[Struct] = []
+        visited = set()
+        visiting = set()
 
+        def visit(struct: Struct):
+            if id(struct) in visited:
+                return
+            if id(struct) in visiting:
+                self.diagnostics.add("warning", f"struct \"{struct.name}\" contains itself")
+                return
 
-    def findout_platform_aware_structs(self):
-        self.packSizeAwareStructs: list[str] = []
-        
-        for file in self.files:
-            structs: list[Struct] = []
-            structs.extend(file.callbacks)
-            structs.extend(file.structs)
-            
-            for struct in structs:
-                if struct.packsize:
+            visiting.add(id(struct))
+            for field in struct.fields:
+                typeinfo = self.resolve_symbol(field.type, self.structFiles.get(struct))
+                if isinstance(typeinfo, Struct):
+                    visit(typeinfo)
+            visiting.remove(id(struct))
+
+            visited.add(id(struct))
+            order.append(struct)
+
+        for f in self.files:
+            for struct in f.callbacks + f.structs:
+                visit(struct)
+
+        return order
+
+    def get_array_count(self, arraysize):
+        if arraysize is None:
+            return 1
+
+        try:
+            return self.evaluate(arraysize)
+        except ValueError:
+            return None
+
+    def evaluate(self, expression):
+        """Evaluates a C integer expression like "k_iSteamUserCallbacks + 17" or "( 1 << 3 )"
+
+        Raises ConstantExpressionError if it uses a constant that is unknown, cyclic or
+        not an integer itself, and ValueError if it is not an integer expression at all."""
+        return evaluate_expression(tokenize_expression(expression), self.lookup_constant, self.constantExpressions.__contains__)
+
+    def lookup_constant(self, name):
+        value = self.evaluate_constant(name)
+        if value is None:
+            raise self.constantErrors[name]
+        return value
+
+    def evaluate_constant(self, name):
+        """Returns the value of a constant, define or enum field, or None if it is not an integer"""
+        if name in self.constantValues:
+            return self.constantValues[name]
+
+        if name in self.evaluating:
+            cycle = self.evaluating[self.evaluating.index(name):] + [name]
+            self.constantErrors[name] = ConstantExpressionError("cycle " + " -> ".join(cycle), name)
+            return None
+
+        expression = self.constantExpressions.get(name)
+        if expression is None:
+            self.constantErrors[name] = ConstantExpressionError(f"\"{name}\" is not a known constant", name)
+            return None
+
+        self.evaluating.append(name)
+        try:
+            tokens = tokenize_expression(expression)
+            self.constantDependencies[name] = [value for kind, value in tokens if kind == "name" and value in self.constantExpressions]
+            value = evaluate_expression(tokens, self.lookup_constant, self.constantExpressions.__contains__)
+        except ValueError as e:
+            value = None
+            # Keep the innermost reason, every constant along the chain reports the same one
+            self.constantErrors[name] = e if isinstance(e, ConstantExpressionError) else ConstantExpressionError(str(e))
+        finally:
+            self.evaluating.pop()
+
+        self.constantValues[name] = value
+        return value
+
+    def evaluate_constants(self):
+        """Evaluates every constant, enum value and callback id, and builds the lookup tables from them"""
+        for name in self.constantExpressions:
+            self.evaluate_constant(name)
+
+        def report(what, error):
+            # Expressions that are not integers at all, like interface version strings, are expected
+            if error.symbol is not None:
+                self.diagnostics.add("warning", f"{what} could not be evaluated: {error}")
+
+        # enum name -> value -> name of the first field with that value
+        self.enumValueNames: dict[str, dict[int, str]] = {}
+        for f in self.files:
+            for constant in f.constants:
+                if self.constantValues.get(constant.name) is None and constant.name in self.constantErrors:
+                    report(f"constant \"{constant.name}\"", self.constantErrors[constant.name])
+
+            for enum in f.enums:
+                names = self.enumValueNames.setdefault(enum.name, {})
+                for field in enum.fields:
+                    name = field.name.rstrip(",")
+                    value = self.constantValues.get(name)
+                    if value is None:
+                        if name in self.constantErrors:
+                            report(f"enum value \"{enum.name}.{name}\"", self.constantErrors[name])
+                        continue
+                    names.setdefault(value, name)
+
+        # callback id -> callback struct
+        self.callbackStructs: dict[int, Struct] = {}
+        for f in self.files:
+            for struct in f.callbacks:
+                if struct.callbackid is None:
+                    continue
+                try:
+                    callbackid = self.evaluate(struct.callbackid)
+                except ValueError as e:
+                    report(f"callback id of \"{struct.name}\"", e if isinstance(e, ConstantExpressionError) else ConstantExpressionError(str(e)))
                     continue
-                
-                structSmall = copy.deepcopy(struct)
 
-                offsetsLargePack: list[FieldOffset] = struct.calculate_offsets(8)
-                offsetsLargePack.sort(lambda item: item.name)
+                other = self.callbackStructs.setdefault(callbackid, struct)
+                if other is not struct:
+                    self.diagnostics.add("warning", f"callbacks \"{other.name}\" and \"{struct.name}\" share the callback id {callbackid}")
+
+    def get_type_layout(self, typeName, pack, filename=None):
+        typeinfo = self.resolveTypeInfo(typeName, filename)
+        if typeinfo is None:
+            return None, None
+
+        if isinstance(typeinfo, Struct):
+            layout = self.structLayouts.get((typeinfo, pack))
+            if layout is None:
+                return None, None
+            return layout.size, layout.align
+
+        size = typeinfo.size
+        align = typeinfo.pack
+        if size == 'intptr':
+            size = g_PointerSize
+        if align == 'intptr':
+            align = g_PointerSize
+        if align is None:
+            align = size
+
+        return size, align
+
+    def calculate_struct_layout(self, struct: Struct, pack):
+        effective_struct_pack = struct.packsize or pack
+
+        fields: list[FieldOffset] = []
+        current_offset = 0
+        max_align = 1
+
+        for field in struct.fields:
+            size, align = self.get_type_layout(field.type, pack, self.structFiles.get(struct))
+            count = self.get_array_count(field.arraysize)
+            if count is None:
+                self.diagnostics.add("warning", f"array size \"{field.arraysize}\" of \"{struct.name}.{field.name}\" could not be resolved")
+            if size is None or count is None:
+                return StructLayout(struct.name, pack, None, None, fields)
+
+            align = max(1, min(align, effective_struct_pack))
+            current_offset += (align - (current_offset % align)) % align
+
+            fields.append(FieldOffset(field.name, current_offset, size * count))
 
-                offsetsSmallPack: list[FieldOffset] = structSmall.calculate_offsets(4)
-                offsetsSmallPack.sort(lambda item: item.name)
-                
-                if offsetsLargePack != offsetsSmallPack or struct.size != structSmall.size:
-                    print(f"Found packsize aware struct '{struct.name}'")
+            current_offset += size * count
+            max_align = max(max_align, align)
+
+        total_size = current_offset + (max_align - (current_offset % max_align)) % max_align
+
+        # Empty structs still take up a byte in C++
+        return StructLayout(struct.name, pack, total_size or 1, max_align, fields)
+
+    def get_struct_layout(self, struct: Struct, pack):
+        """Returns the StructLayout of this very struct for a pack in g_LayoutPacks, or None"""
+        return self.structLayouts.get((struct, pack))
+
+    def populate_struct_layouts(self, structs=None):
+        """Computes every struct's layout once per pack in g_LayoutPacks into self.structLayouts
+
+        self.layouts has the same layouts by struct name, where a name defined in several
+        files gets the first definition's layout, like self.symbols."""
+        order = self.sort_structs_by_dependency()
+
+        if structs is None:
+            self.structLayouts: dict[tuple[Struct, int], StructLayout] = {}
+        else:
+            subset = {id(struct) for struct in structs}
+            order = [struct for struct in order if id(struct) in subset]
+
+        for pack in g_LayoutPacks:
+            for struct in order:
+                self.structLayouts[(struct, pack)] = self.calculate_struct_layout(struct, pack)
+
+        current = [struct for f in self.files for struct in f.structs + f.callbacks]
+        if structs is not None:
+            # Forget the structs update() replaced or removed
+            kept = set(current)
+            self.structLayouts = {key: layout for key, layout in self.structLayouts.items() if key[0] in kept}
+
+        self.layouts: dict[tuple[str, int], StructLayout] = {}
+        for pack in g_LayoutPacks:
+            for struct in current:
+                self.layouts.setdefault((struct.name, pack), self.structLayouts[(struct, pack)])
+
+    def populate_struct_field_layout(self, defaultPack = 8, structs=None):
+        if structs is None:
+            structs = [struct for f in self.files for struct in f.callbacks + f.structs]
+
+        for struct in structs:
+            for field in struct.fields:
+                field.size, field.pack = self.get_type_layout(field.type, defaultPack, self.structFiles.get(struct))
+
+            struct.size = self.structLayouts[(struct, defaultPack)].size
+
+
+    def findout_platform_aware_structs(self, structs=None):
+        if structs is None:
+            self.packSizeAwareStructs: list[str] = []
+            structs = [struct for f in self.files for struct in f.callbacks + f.structs]
+        else:
+            names = {struct.name for struct in structs}
+            self.packSizeAwareStructs = [name for name in self.packSizeAwareStructs if name not in names]
+
+        for struct in structs:
+            layouts = [self.structLayouts[(struct, pack)] for pack in g_LayoutPacks]
+            largeLayout = layouts[0]
+
+            struct.packsize_aware = False
+            for layout in layouts[1:]:
+                if layout.size != largeLayout.size or \
+                    [(f.name, f.offset) for f in layout.fields] != [(f.name, f.offset) for f in largeLayout.fields]:
                     struct.packsize_aware = True
-                    self.packSizeAwareStructs.append(struct.name)
 
-        pass
+            if struct.packsize_aware:
+                self.diagnostics.add("info", f"Found packsize aware struct '{struct.name}'")
+                self.packSizeAwareStructs.append(struct.name)
+
+
+class ParseStream:
+    """Hands out each SteamFile as soon as it is parsed, finish() then returns the finished Parser"""
 
+    def __init__(self, folder, jobs=None, only=None):
+        self.parser = Parser.__new__(Parser)
+        self.parser.begin(folder)
+        self.files = self.parser.iter_files(jobs, only)
+        self.finished = False
 
-def printWarning(string, s):
-    print("[WARNING] " + string + " - In File: " + s.f.name + " - On Line " + str(s.linenum) + " - " + s.line)
+    def __iter__(self):
+        return self.files
 
+    def finish(self):
+        if not self.finished:
+            # Parse whatever the caller did not iterate over
+            for f in self.files:
+                pass
+            self.parser.finish()
+            self.finished = True
 
-def printUnhandled(string, s):
-    print("[UNHANDLED] " + string + " - In File: " + s.f.name + " - On Line " + str(s.linenum) + " - " + s.line)
+        return self.parser
 
 
-def parse(folder):
-    """Parses the Steamworks headers contained in a folder"""
-    return Parser(folder)
+class ConstantExpressionError(ValueError):
+    """A constant expression uses a symbol that has no integer value, symbol is the one it stopped at"""
+
+    def __init__(self, message, symbol=None):
+        super().__init__(message)
+        self.symbol = symbol
+
+
+# C precedence of the binary operators we evaluate, higher binds tighter
+g_BinaryOperators = {
+    "|": 1, "^": 2, "&": 3, "<<": 4, ">>": 4, "+": 5, "-": 5, "*": 6, "/": 6, "%": 6,
+}
+
+
+def tokenize_expression(expression):
+    """Splits a C integer expression into ("number", int), ("name", str) and ("op", str) tokens"""
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        result = g_ExpressionTokenPattern.match(expression, pos)
+        if not result:
+            raise ValueError(f"\"{expression}\" is not an integer expression")
+        number, name, op = result.groups()
+        if number is not None:
+            # C reads a leading 0 as octal
+            tokens.append(("number", int(number, 8) if len(number) > 1 and number[0] == "0" and number[1] not in "xX" else int(number, 0)))
+        elif name is not None:
+            tokens.append(("name", name))
+        else:
+            tokens.append(("op", op))
+        pos = result.end()
+
+    if not tokens:
+        raise ValueError("empty expression")
+    return tokens
+
+
+def evaluate_expression(tokens, lookup, isConstant):
+    """Evaluates tokenize_expression's tokens, lookup(name) returns the value of a constant
+
+    isConstant(name) tells constants apart from type names, so "(uint32)1" is read as a cast."""
+    pos = 0
+
+    def peek(offset=0):
+        return tokens[pos + offset] if pos + offset < len(tokens) else (None, None)
+
+    def expect_operand():
+        if peek()[0] is None:
+            raise ValueError("unexpected end of expression")
+
+    def binary(minPrecedence):
+        nonlocal pos
+        left = unary()
+        while True:
+            kind, op = peek()
+            precedence = g_BinaryOperators.get(op) if kind == "op" else None
+            if precedence is None or precedence < minPrecedence:
+                return left
+            pos += 1
+            right = binary(precedence + 1)
+            if op == "|":
+                left |= right
+            elif op == "^":
+                left ^= right
+            elif op == "&":
+                left &= right
+            elif op == "<<":
+                left <<= right
+            elif op == ">>":
+                left >>= right
+            elif op == "+":
+                left += right
+            elif op == "-":
+                left -= right
+            elif op == "*":
+                left *= right
+            elif right == 0:
+                raise ValueError("division by zero")
+            else:
+                # C truncates towards zero
+                quotient = abs(left) // abs(right) * (1 if (left < 0) == (right < 0) else -1)
+                left = quotient if op == "/" else left - quotient * right
+
+    def unary():
+        nonlocal pos
+        expect_operand()
+        kind, value = peek()
+        if kind == "op" and value in ("-", "+", "~", "!"):
+            pos += 1
+            operand = unary()
+            if value == "-":
+                return -operand
+            if value == "~":
+                return ~operand
+            if value == "!":
+                return int(not operand)
+            return operand
+        return primary()
+
+    def is_cast():
+        # "(" followed by type names and ")", then something to cast
+        count = 0
+        while peek(1 + count)[0] == "name" or peek(1 + count) == ("op", "*"):
+            count += 1
+        if count == 0 or peek(1 + count) != ("op", ")"):
+            return False
+        if count == 1 and isConstant(peek(1)[1]):
+            return False
+        kind, value = peek(2 + count)
+        return kind in ("number", "name") or value in ("(", "-", "+", "~", "!")
+
+    def primary():
+        nonlocal pos
+        kind, value = peek()
+        if kind == "number":
+            pos += 1
+            return value
+        if kind == "name":
+            pos += 1
+            return lookup(value)
+        if value == "(":
+            if is_cast():
+                while peek() != ("op", ")"):
+                    pos += 1
+                pos += 1
+                return unary()
+            pos += 1
+            result = binary(1)
+            if peek() != ("op", ")"):
+                raise ValueError("missing ')'")
+            pos += 1
+            return result
+        raise ValueError(f"unexpected \"{value}\"")
+
+    result = binary(1)
+    if pos != len(tokens):
+        raise ValueError(f"unexpected \"{tokens[pos][1]}\"")
+    return result
+
+
+def list_header_files(folder):
+    files = [f for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f)) and f.endswith(".h") and f not in g_SkippedFiles]
+    files.sort()
+    return files
+
+
+def decode_header(data):
+    # Headers are latin-1 unless they start with a UTF-8 BOM
+    bHasBOM = data[:3] == codecs.BOM_UTF8
+    with memoryview(data) as view:
+        if bHasBOM:
+            text = str(view[3:], "utf-8")
+        else:
+            text = str(view, "latin-1")
+
+    # Same newline handling as opening the file in text mode
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+    return text, bHasBOM
+
+
+def read_header(filepath):
+    """Reads and decodes a header in one go, returns the text and whether it had a UTF-8 BOM"""
+    with open(filepath, 'rb') as infile:
+        if os.fstat(infile.fileno()).st_size < g_MmapThreshold:
+            return decode_header(infile.read())
+
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return decode_header(data)
+
+
+def iter_lines(text):
+    """Yields the lines of text one at a time, keeping the line endings like readlines() does"""
+    start = 0
+    end = len(text)
+    while start < end:
+        pos = text.find("\n", start) + 1 or end
+        yield text[start:pos]
+        start = pos
+
+
+def count_entities(f: SteamFile):
+    """Returns how many entities of each kind a parsed file holds"""
+    functions = [function for interface in f.interfaces for function in interface.functions]
+    structs = f.structs + f.callbacks
+    return {
+        "defines": len(f.defines),
+        "constants": len(f.constants),
+        "typedefs": len(f.typedefs),
+        "enums": len(f.enums),
+        "enumfields": sum(len(enum.fields) for enum in f.enums),
+        "structs": len(f.structs),
+        "callbacks": len(f.callbacks),
+        "fields": sum(len(struct.fields) for struct in structs),
+        "interfaces": len(f.interfaces),
+        "functions": len(functions),
+        "args": sum(len(function.args) for function in functions),
+    }
+
+
+def scan_includes(filepath):
+    """Returns the headers a file includes from the preprocessor lines at its top, reading no further than its first declaration"""
+    includes = []
+    bInComment = False
+    with open(filepath, 'rb') as infile:
+        for line in infile:
+            line = line.strip()
+            if line.startswith(codecs.BOM_UTF8):
+                line = line[len(codecs.BOM_UTF8):].lstrip()
+
+            if bInComment:
+                bInComment = b"*/" not in line
+                continue
+            if not line or line.startswith(b"//"):
+                continue
+            if line.startswith(b"/*"):
+                bInComment = b"*/" not in line
+                continue
+            if not line.startswith(b"#"):
+                break
+
+            match = g_IncludePattern.match(line)
+            if match:
+                includes.append(os.path.basename(match.group(1).decode("latin-1")))
+    return includes
+
+
+def scan_header(filepath):
+    """Returns the headers a file includes and the names it declares, from a quick scan of its bytes before it is parsed"""
+    with open(filepath, 'rb') as infile:
+        data = infile.read()
+
+    includes = [os.path.basename(name.decode("latin-1")) for name in g_IncludePattern.findall(data)]
+    declarations = [name.decode("latin-1") for groups in g_DeclarationPattern.findall(data) for name in groups if name]
+    return includes, declarations
+
+
+def get_declaring_files(scans):
+    # name -> headers declaring it, in sorted header order
+    declaredBy = {}
+    for filename in sorted(scans):
+        for name in scans[filename][1]:
+            files = declaredBy.setdefault(name, [])
+            if filename not in files:
+                files.append(filename)
+    return declaredBy
+
+
+def get_include_closure(names, scans):
+    closure = []
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name in scans and name not in closure:
+            closure.append(name)
+            pending.extend(scans[name][0])
+    return sorted(closure)
+
+
+def get_topological_order(names, graph):
+    """Orders names so that everything a name points to in graph comes before it, ties stay in the given order"""
+    order = []
+    visited = set()
+
+    def visit(name):
+        # Cycles are broken at the first name seen again
+        if name in visited:
+            return
+        visited.add(name)
+        for other in graph.get(name, ()):
+            if other in graph:
+                visit(other)
+        order.append(name)
+
+    for name in names:
+        visit(name)
+    return order
+
+
+def get_include_order(folder, names, includes=None):
+    """Orders the headers so that each one comes after the headers it includes
+
+    includes maps header names to the headers they include, the headers are scanned if it is not given."""
+    if includes is None:
+        includes = {name: scan_includes(os.path.join(folder, name)) for name in names}
+    graph = {name: includes.get(name, []) for name in names}
+    return get_topological_order(names, graph)
+
+
+def get_base_type_name(typeName):
+    # "const SteamParamStringArray_t *" -> "SteamParamStringArray_t"
+    words = [word for word in typeName.replace("*", " ").replace("&", " ").split() if word not in ("const", "struct", "enum", "unsigned")]
+    return words[-1] if words else typeName
+
+
+def get_declared_type_names(f: SteamFile):
+    names = [typedef.name for typedef in f.typedefs]
+    names.extend(enum.name for enum in f.enums)
+    names.extend(struct.name for struct in f.structs)
+    names.extend(struct.name for struct in f.callbacks)
+    return names
+
+
+def get_declared_constant_names(f: SteamFile):
+    names = [constant.name for constant in f.constants]
+    names.extend(define.name for define in f.defines)
+    names.extend(field.name.rstrip(",") for enum in f.enums for field in enum.fields)
+    return names
+
+
+def get_layout_state(f: SteamFile):
+    """Returns everything the cross-file passes write into a file's typedefs and structs"""
+    return (
+        [(typedef.size, typedef.pack) for typedef in f.typedefs],
+        [(struct.size, struct.packsize_aware, [(field.size, field.pack) for field in struct.fields]) for struct in f.structs + f.callbacks],
+    )
+
+
+def set_layout_state(f: SteamFile, state):
+    typedefs, structs = state
+    for typedef, (size, pack) in zip(f.typedefs, typedefs):
+        typedef.size = size
+        typedef.pack = pack
+
+    for struct, (size, packsize_aware, fields) in zip(f.structs + f.callbacks, structs):
+        struct.size = size
+        struct.packsize_aware = packsize_aware
+        for field, (size, pack) in zip(struct.fields, fields):
+            field.size = size
+            field.pack = pack
+
+
+def get_settings():
+    return {name: value for name, value in vars(Settings).items() if not name.startswith("_")}
+
+
+def _parse_file_job(folder, name, settings):
+    # Runs in a worker process, which may not have inherited the caller's Settings
+    for key, value in settings.items():
+        setattr(Settings, key, value)
+
+    # Line-level parsing needs none of the cross-file state
+    parser = Parser.__new__(Parser)
+    parser.begin(folder)
+    return parser.parse_file(SteamFile(name)), parser.stats, parser.diagnostics.records
+
+
+def get_cache_key(folder, only=None):
+    """Hashes every header in the folder together with the Settings flags, the parser version and the only selection"""
+    h = hashlib.sha256()
+    h.update(("version:" + str(g_ParserVersion) + "\n").encode())
+    if only is not None:
+        h.update(("only:" + ",".join(sorted(only)) + "\n").encode())
+
+    for name, value in sorted(get_settings().items()):
+        if name in g_UncachedSettings:
+            continue
+        h.update(("setting:" + name + "=" + repr(value) + "\n").encode())
+
+    for name in list_header_files(folder):
+        with open(os.path.join(folder, name), 'rb') as infile:
+            content = infile.read()
+        h.update(("file:" + name + ":" + str(len(content)) + "\n").encode())
+        h.update(content)
+
+    return h.hexdigest()
+
+
+class LayoutMatrix:
+    """Offsets and sizes of every struct and callback for every pack and pointer size at once
+
+    sizes and aligns have the shape (structs, packs, pointer sizes), fieldOffsets and fieldSizes
+    (fields, packs, pointer sizes), with -1 where a type could not be resolved. The fields of the
+    struct in row i are rows fieldStart[i] to fieldStart[i + 1] of the field arrays."""
+
+    def __init__(self, packs, pointerSizes, structs, sizes, aligns, fieldStart, fieldOffsets, fieldSizes):
+        self.packs = tuple(packs)
+        self.pointerSizes = tuple(pointerSizes)
+        self.structs: list[Struct] = structs
+        self.rows = {}  # name -> row, the first definition of a name wins like in Parser.symbols
+        for i, struct in enumerate(structs):
+            self.rows.setdefault(struct.name, i)
+        self.sizes = sizes
+        self.aligns = aligns
+        self.fieldStart = fieldStart
+        self.fieldOffsets = fieldOffsets
+        self.fieldSizes = fieldSizes
+
+    def layout(self, name, pack, pointerSize=8):
+        """Returns the StructLayout of one struct, like Parser.layouts holds for the packs in g_LayoutPacks"""
+        row = self.rows[name]
+        p = self.packs.index(pack)
+        w = self.pointerSizes.index(pointerSize)
+        if self.sizes[row, p, w] < 0:
+            return StructLayout(name, pack, None, None, [])
+
+        fields = [FieldOffset(field.name, int(self.fieldOffsets[i, p, w]), int(self.fieldSizes[i, p, w]))
+                  for i, field in zip(range(self.fieldStart[row], self.fieldStart[row + 1]), self.structs[row].fields)]
+        return StructLayout(name, pack, int(self.sizes[row, p, w]), int(self.aligns[row, p, w]), fields)
+
+    def packsize_aware_structs(self, packs=None, pointerSize=8):
+        """Names of the structs whose size or offsets differ between any of the given packs"""
+        import numpy
+
+        w = self.pointerSizes.index(pointerSize)
+        columns = [self.packs.index(pack) for pack in packs or self.packs]
+
+        sizes = self.sizes[:, columns, w]
+        offsets = self.fieldOffsets[:, columns, w]
+        differs = (sizes != sizes[:, :1]).any(axis=1)
+        fieldDiffers = (offsets != offsets[:, :1]).any(axis=1)
+        # Number of moved fields per struct, from the running total over the field table
+        movedTotal = numpy.concatenate(([0], numpy.cumsum(fieldDiffers)))
+        movedFields = movedTotal[self.fieldStart[1:]] - movedTotal[self.fieldStart[:-1]]
+
+        return [struct.name for struct, bDiffers in zip(self.structs, differs | (movedFields > 0)) if bDiffers]
+
+
+def compute_layout_matrix(parser, packs=(1, 2, 4, 8, 16), pointerSizes=(4, 8)):
+    """Lays out every struct and callback for every combination of packs and pointerSizes in one pass, needs numpy
+
+    Structs are processed in dependency levels, each level is laid out for all of its structs and
+    all combinations at once, walking over the field position instead of over the structs."""
+    # Imported here, numpy alone would multiply the import time of the module and of every worker process
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("compute_layout_matrix needs the numpy package, pip install numpy") from None
+
+    structs = parser.sort_structs_by_dependency()
+    rows = {id(struct): i for i, struct in enumerate(structs)}
+    nconfigs = len(packs) * len(pointerSizes)
+    pack = numpy.repeat(numpy.array(packs, numpy.int64), len(pointerSizes))
+    pointerSize = numpy.tile(numpy.array(pointerSizes, numpy.int64), len(packs))
+
+    # Flattened field table: the natural size and alignment of each field's type,
+    # 0 for pointer sized ones, or the row of the struct it contains
+    fieldStart = numpy.zeros(len(structs) + 1, numpy.int64)
+    primSize, primAlign, nested, count = [], [], [], []
+    levels = [0] * len(structs)
+    for i, struct in enumerate(structs):
+        for field in struct.fields:
+            typeinfo = g_PrimitiveTypesLayout.get(field.type)
+            if typeinfo is None and '*' in field.type:
+                typeinfo = g_PrimitiveTypesLayout["intptr"]
+            if typeinfo is None:
+                typeinfo = parser.resolve_symbol(field.type, parser.structFiles.get(struct))
+
+            size = align = -1
+            row = -1
+            if isinstance(typeinfo, Struct):
+                row = rows[id(typeinfo)]
+                levels[i] = max(levels[i], levels[row] + 1)
+            elif typeinfo is not None and typeinfo.size is not None:
+                size = 0 if typeinfo.size == 'intptr' else typeinfo.size
+                align = typeinfo.pack
+                if align is None:
+                    align = typeinfo.size
+                if align == 'intptr':
+                    align = 0
+
+            arraycount = parser.get_array_count(field.arraysize)
+            primSize.append(size)
+            primAlign.append(align)
+            nested.append(row)
+            count.append(-1 if arraycount is None else arraycount)
+        fieldStart[i + 1] = len(primSize)
+
+    primSize = numpy.array(primSize, numpy.int64)
+    primAlign = numpy.array(primAlign, numpy.int64)
+    nested = numpy.array(nested, numpy.int64)
+    count = numpy.array(count, numpy.int64)
+
+    # Size and alignment of every field's type in every configuration, struct fields get filled in level by level
+    fieldTypeSize = numpy.where(primSize[:, None] == 0, pointerSize[None, :], primSize[:, None]) * numpy.ones((1, nconfigs), numpy.int64)
+    fieldTypeAlign = numpy.where(primAlign[:, None] == 0, pointerSize[None, :], primAlign[:, None]) * numpy.ones((1, nconfigs), numpy.int64)
+
+    sizes = numpy.full((len(structs), nconfigs), -1, numpy.int64)
+    aligns = numpy.full((len(structs), nconfigs), -1, numpy.int64)
+    fieldOffsets = numpy.full((len(primSize), nconfigs), -1, numpy.int64)
+    fieldSizes = numpy.full((len(primSize), nconfigs), -1, numpy.int64)
+    structPack = numpy.array([struct.packsize or 0 for struct in structs], numpy.int64)
+    numfields = numpy.diff(fieldStart)
+    levels = numpy.array(levels, numpy.int64)
+
+    for level in range(int(levels.max()) + 1 if len(structs) else 0):
+        members = numpy.nonzero(levels == level)[0]
+
+        isNested = nested >= 0
+        fieldTypeSize[isNested] = sizes[nested[isNested]]
+        fieldTypeAlign[isNested] = aligns[nested[isNested]]
+
+        effectivePack = numpy.where(structPack[members, None] > 0, structPack[members, None], pack[None, :])
+        current = numpy.zeros((len(members), nconfigs), numpy.int64)
+        maxAlign = numpy.ones((len(members), nconfigs), numpy.int64)
+        valid = numpy.ones((len(members), nconfigs), bool)
+
+        for j in range(int(numfields[members].max()) if len(members) else 0):
+            hasField = numfields[members] > j
+            fields = fieldStart[members[hasField]] + j
+            active = numpy.nonzero(hasField)[0]
+
+            size = fieldTypeSize[fields]
+            align = numpy.maximum(1, numpy.minimum(fieldTypeAlign[fields], effectivePack[active]))
+            fieldValid = valid[active] & (size >= 0) & (fieldTypeAlign[fields] >= 0) & (count[fields, None] >= 0)
+
+            offset = current[active] + (-current[active]) % align
+            total = size * count[fields, None]
+
+            fieldOffsets[fields] = numpy.where(fieldValid, offset, -1)
+            fieldSizes[fields] = numpy.where(fieldValid, total, -1)
+            current[active] = offset + total
+            maxAlign[active] = numpy.maximum(maxAlign[active], align)
+            valid[active] = fieldValid
+
+        total = current + (-current) % maxAlign
+        # Empty structs still take up a byte in C++
+        sizes[members] = numpy.where(valid, numpy.maximum(total, 1), -1)
+        aligns[members] = numpy.where(valid, maxAlign, -1)
+
+    shape = (len(packs), len(pointerSizes))
+    return LayoutMatrix(packs, pointerSizes, structs,
+                        sizes.reshape((len(structs),) + shape), aligns.reshape((len(structs),) + shape), fieldStart,
+                        fieldOffsets.reshape((len(primSize),) + shape), fieldSizes.reshape((len(primSize),) + shape))
+
+
+def comment_to_dict(c):
+    if c is None:
+        return None
+    return {"precomments": c.precomments, "linecomment": c.linecomment}
+
+
+def struct_to_dict(struct: Struct, parser, comments=True):
+    layouts = []
+    for pack in g_LayoutPacks:
+        layout = parser.get_struct_layout(struct, pack)
+        if layout is not None:
+            layouts.append({
+                "pack": pack,
+                "size": layout.size,
+                "align": layout.align,
+                "offsets": [{"name": field.name, "offset": field.offset, "size": field.size} for field in layout.fields],
+            })
+
+    return {
+        "name": struct.name,
+        "packsize": struct.packsize,
+        "callbackid": struct.callbackid,
+        "size": struct.size,
+        "packsize_aware": struct.packsize_aware,
+        "comment": comment_to_dict(struct.c) if comments else None,
+        "fields": [{
+            "name": field.name,
+            "type": field.type,
+            "arraysize": field.arraysize,
+            "size": field.size,
+            "pack": field.pack,
+            "comment": comment_to_dict(field.c) if comments else None,
+        } for field in struct.fields],
+        "layouts": layouts,
+    }
+
+
+def function_to_dict(function: Function, comments=True):
+    return {
+        "name": function.name,
+        "returntype": function.returntype,
+        "private": function.private,
+        "ifstatements": function.ifstatements,
+        "comments": function.comments if comments else None,
+        "linecomment": function.linecomment if comments else None,
+        "attributes": [{"name": attribute.name, "value": attribute.value} for attribute in function.attributes],
+        "args": [{
+            "name": arg.name,
+            "type": arg.type,
+            "default": arg.default,
+            "attribute": {"name": arg.attribute.name, "value": arg.attribute.value} if arg.attribute else None,
+        } for arg in function.args],
+    }
+
+
+def file_to_dict(f: SteamFile, parser, comments=True):
+    """Turns one parsed file into plain dicts and lists, ready for json or msgpack"""
+    return {
+        "name": f.name,
+        "includes": f.includes,
+        "defines": [{
+            "name": define.name,
+            "value": define.value,
+            "comment": comment_to_dict(define.c) if comments else None,
+        } for define in f.defines],
+        "constants": [{
+            "name": constant.name,
+            "type": constant.type,
+            "value": constant.value,
+            "comment": comment_to_dict(constant.c) if comments else None,
+        } for constant in f.constants],
+        "typedefs": [{
+            "name": typedef.name,
+            "type": typedef.type,
+            "size": typedef.size,
+            "pack": typedef.pack,
+            "comment": comment_to_dict(typedef.c) if comments else None,
+        } for typedef in f.typedefs],
+        "enums": [{
+            "name": enum.name,
+            "comment": comment_to_dict(enum.c) if comments else None,
+            "fields": [{
+                "name": field.name,
+                "value": field.value,
+                "comment": comment_to_dict(field.c) if comments else None,
+            } for field in enum.fields],
+        } for enum in f.enums],
+        "structs": [struct_to_dict(struct, parser, comments) for struct in f.structs],
+        "callbacks": [struct_to_dict(struct, parser, comments) for struct in f.callbacks],
+        "interfaces": [{
+            "name": interface.name,
+            "comment": comment_to_dict(interface.c) if comments else None,
+            "functions": [function_to_dict(function, comments) for function in interface.functions],
+        } for interface in f.interfaces],
+    }
+
+
+def export_json(parser, outfile, comments=True):
+    """Writes the whole model to a text file object as JSON, one file at a time
+
+    Set comments to False to leave every comment out, which also keeps lazy comments unparsed."""
+    outfile.write('{"packSizeAwareStructs":')
+    outfile.write(json.dumps(parser.packSizeAwareStructs))
+    outfile.write(',"files":[')
+    for i, f in enumerate(parser.files):
+        if i:
+            outfile.write(",")
+        outfile.write(json.dumps(file_to_dict(f, parser, comments), separators=(",", ":")))
+    outfile.write("]}")
+
+
+def export_msgpack(parser, outfile, comments=True):
+    """Writes the same document as export_json to a binary file object as MessagePack, needs the msgpack package"""
+    try:
+        import msgpack
+    except ImportError:
+        raise ImportError("export_msgpack needs the msgpack package, pip install msgpack") from None
+
+    packer = msgpack.Packer()
+    outfile.write(packer.pack_map_header(2))
+    outfile.write(packer.pack("packSizeAwareStructs"))
+    outfile.write(packer.pack(parser.packSizeAwareStructs))
+    outfile.write(packer.pack("files"))
+    outfile.write(packer.pack_array_header(len(parser.files)))
+    for f in parser.files:
+        outfile.write(packer.pack(file_to_dict(f, parser, comments)))
+
+
+# Binary snapshot: a header, then one int32 array per table below, then the UTF-8 string data.
+# Strings are stored as ids into the string table, lists of child entities as (first row, count)
+# pairs, -1 stands for None and -2 for 'intptr'. Everything is in native byte order.
+g_SnapshotMagic = b"SWPS"
+g_SnapshotVersion = 2
+
+
+class SnapshotView:
+    """Reads one row of a snapshot table on attribute access, nothing is decoded up front"""
+    __slots__ = ("snapshot", "row")
+    table = None
+    # (name, kind): kind is "s" for a string, "i" an int, "b" a bool, "S" a list of strings,
+    # or the table name of a list of child rows, which takes two columns
+    columns = ()
+    commented = False  # has precomments and linecomment columns, exposed through .c
+
+    def __init_subclass__(cls):
+        if cls.commented:
+            cls.columns = cls.columns + (("precomments", "S"), ("linecomment", "s"))
+
+        cls.offsets = {}
+        offset = 0
+        for name, kind in cls.columns:
+            cls.offsets[name] = (offset, kind)
+            offset += 1 if kind in ("s", "i", "b") else 2
+        cls.ncolumns = offset
+        g_SnapshotViews[cls.table] = cls
+
+    def __init__(self, snapshot, row):
+        self.snapshot = snapshot
+        self.row = row
+
+    def __getattr__(self, name):
+        spec = self.offsets.get(name)
+        if spec is None:
+            raise AttributeError(name)
+        return self.snapshot.read(self.table, self.row, *spec)
+
+    @property
+    def c(self):
+        if not self.commented:
+            raise AttributeError("c")
+        return Comment(None, self.precomments, None, self.linecomment)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name if 'name' in self.offsets else self.row}>"
+
+
+g_SnapshotViews: dict[str, type[SnapshotView]] = {}
+
+
+class SnapshotFile(SnapshotView):
+    __slots__ = ()
+    table = "files"
+    columns = (("name", "s"), ("includes", "S"), ("defines", "defines"), ("constants", "constants"), ("typedefs", "typedefs"),
+               ("enums", "enums"), ("structs", "structs"), ("callbacks", "structs"), ("interfaces", "interfaces"))
+
+class SnapshotDefine(SnapshotView):
+    __slots__ = ()
+    table = "defines"
+    columns = (("name", "s"), ("value", "s"), ("spacing", "s"))
+    commented = True
+
+class SnapshotConstant(SnapshotView):
+    __slots__ = ()
+    table = "constants"
+    columns = (("name", "s"), ("value", "s"), ("type", "s"))
+    commented = True
+
+class SnapshotTypedef(SnapshotView):
+    __slots__ = ()
+    table = "typedefs"
+    columns = (("name", "s"), ("type", "s"), ("filename", "s"), ("size", "i"), ("pack", "i"))
+    commented = True
+
+class SnapshotEnum(SnapshotView):
+    __slots__ = ()
+    table = "enums"
+    columns = (("name", "s"), ("fields", "enumfields"), ("size", "i"), ("pack", "i"))
+    commented = True
+
+class SnapshotEnumField(SnapshotView):
+    __slots__ = ()
+    table = "enumfields"
+    columns = (("name", "s"), ("value", "s"), ("prespacing", "s"), ("postspacing", "s"))
+    commented = True
+
+class SnapshotStruct(SnapshotView):
+    __slots__ = ()
+    table = "structs"
+    columns = (("name", "s"), ("packsize", "i"), ("callbackid", "s"), ("size", "i"), ("packsize_aware", "b"),
+               ("fields", "fields"), ("layouts", "layouts"))
+    commented = True
+
+    @property
+    def pack(self):
+        return self.packsize
+
+class SnapshotStructField(SnapshotView):
+    __slots__ = ()
+    table = "fields"
+    columns = (("name", "s"), ("type", "s"), ("arraysize", "s"), ("size", "i"), ("pack", "i"))
+    commented = True
+
+class SnapshotStructLayout(SnapshotView):
+    __slots__ = ()
+    table = "layouts"
+    columns = (("name", "s"), ("pack", "i"), ("size", "i"), ("align", "i"), ("fields", "offsets"))
+
+class SnapshotFieldOffset(SnapshotView):
+    __slots__ = ()
+    table = "offsets"
+    columns = (("name", "s"), ("offset", "i"), ("size", "i"))
+
+class SnapshotInterface(SnapshotView):
+    __slots__ = ()
+    table = "interfaces"
+    columns = (("name", "s"), ("functions", "functions"))
+    commented = True
+
+class SnapshotFunction(SnapshotView):
+    __slots__ = ()
+    table = "functions"
+    columns = (("name", "s"), ("returntype", "s"), ("args", "args"), ("ifstatement", "s"), ("comments", "S"),
+               ("linecomment", "s"), ("attributes", "funcattributes"), ("private", "b"))
+
+    @property
+    def ifstatements(self):
+        # Like Function.ifstatements: the innermost #if condition, or an empty list outside of any #if
+        ifstatement = self.ifstatement
+        return [] if ifstatement is None else ifstatement
+
+class SnapshotArg(SnapshotView):
+    __slots__ = ()
+    table = "args"
+    columns = (("name", "s"), ("type", "s"), ("default", "s"), ("attributes", "argattributes"))
+
+    @property
+    def attribute(self):
+        attributes = self.attributes
+        return attributes[0] if attributes else None
+
+class SnapshotArgAttribute(SnapshotView):
+    __slots__ = ()
+    table = "argattributes"
+    columns = (("name", "s"), ("value", "s"))
+
+class SnapshotFunctionAttribute(SnapshotView):
+    __slots__ = ()
+    table = "funcattributes"
+    columns = (("name", "s"), ("value", "s"))
+
+class SnapshotRoot(SnapshotView):
+    __slots__ = ()
+    table = "root"
+    columns = (("files", "files"), ("packSizeAwareStructs", "S"))
+
+
+# Table order in the file, stringlists holds the string ids of every "S" column
+g_SnapshotTables = tuple(g_SnapshotViews) + ("stringlists", "stringoffsets")
+
+
+class SnapshotWriter:
+    def __init__(self):
+        self.tables = {name: array.array('i') for name in g_SnapshotTables}
+        self.strings: dict[str, int] = {}
+
+    def string(self, value):
+        if value is None:
+            return -1
+        sid = self.strings.get(value)
+        if sid is None:
+            sid = self.strings[value] = len(self.strings)
+        return sid
+
+    def integer(self, value):
+        if value is None:
+            return -1
+        if value == 'intptr':
+            return -2
+        return value
+
+    def strings_range(self, values):
+        stringlists = self.tables["stringlists"]
+        first = len(stringlists)
+        stringlists.extend(self.string(value) for value in values or ())
+        return [first, len(stringlists) - first]
+
+    def comment(self, c):
+        if c is None:
+            return [-1, 0, -1]
+        return self.strings_range(c.precomments) + [self.string(c.linecomment)]
+
+    def rows(self, table):
+        return len(self.tables[table]) // g_SnapshotViews[table].ncolumns
+
+    def add(self, table, values):
+        self.tables[table].extend(values)
+
+    def add_all(self, table, items, write):
+        # Writes every item's row back to back and returns the (first row, count) pair pointing at them
+        first = self.rows(table)
+        for item in items:
+            write(item)
+        return [first, self.rows(table) - first]
+
+    def write_struct(self, struct: Struct, parser):
+        fields = self.add_all("fields", struct.fields, lambda field: self.add("fields",
+            [self.string(field.name), self.string(field.type), self.string(field.arraysize),
+             self.integer(field.size), self.integer(field.pack)] + self.comment(field.c)))
+
+        layouts = [layout for layout in (parser.get_struct_layout(struct, pack) for pack in g_LayoutPacks) if layout is not None]
+        layouts = self.add_all("layouts", layouts, lambda layout: self.add("layouts",
+            [self.string(layout.name), layout.pack, self.integer(layout.size), self.integer(layout.align)] +
+            self.add_all("offsets", layout.fields, lambda offset: self.add("offsets",
+                [self.string(offset.name), offset.offset, self.integer(offset.size)]))))
+
+        self.add("structs", [self.string(struct.name), self.integer(struct.packsize), self.string(struct.callbackid),
+                             self.integer(struct.size), int(struct.packsize_aware)] + fields + layouts + self.comment(struct.c))
+
+    def write_function(self, function: Function):
+        args = self.add_all("args", function.args, lambda arg: self.add("args",
+            [self.string(arg.name), self.string(arg.type), self.string(arg.default)] +
+            self.add_all("argattributes", [arg.attribute] if arg.attribute else [], lambda attribute: self.add("argattributes",
+                [self.string(attribute.name), self.string(attribute.value)]))))
+
+        attributes = self.add_all("funcattributes", function.attributes, lambda attribute: self.add("funcattributes",
+            [self.string(attribute.name), self.string(attribute.value)]))
+
+        self.add("functions", [self.string(function.name), self.string(function.returntype)] + args +
+                 [self.string(function.ifstatements or None)] + self.strings_range(function.comments) +
+                 [self.string(function.linecomment)] + attributes + [int(function.private)])
+
+    def write_file(self, f: SteamFile, parser):
+        defines = self.add_all("defines", f.defines, lambda define: self.add("defines",
+            [self.string(define.name), self.string(define.value), self.string(define.spacing)] + self.comment(define.c)))
+
+        constants = self.add_all("constants", f.constants, lambda constant: self.add("constants",
+            [self.string(constant.name), self.string(constant.value), self.string(constant.type)] + self.comment(constant.c)))
+
+        typedefs = self.add_all("typedefs", f.typedefs, lambda typedef: self.add("typedefs",
+            [self.string(typedef.name), self.string(typedef.type), self.string(typedef.filename),
+             self.integer(typedef.size), self.integer(typedef.pack)] + self.comment(typedef.c)))
+
+        enums = self.add_all("enums", f.enums, lambda enum: self.add("enums",
+            [self.string(enum.name)] +
+            self.add_all("enumfields", enum.fields, lambda field: self.add("enumfields",
+                [self.string(field.name), self.string(field.value), self.string(field.prespacing),
+                 self.string(field.postspacing)] + self.comment(field.c))) +
+            [enum.size, enum.pack] + self.comment(enum.c)))
+
+        structs = self.add_all("structs", f.structs, lambda struct: self.write_struct(struct, parser))
+        callbacks = self.add_all("structs", f.callbacks, lambda struct: self.write_struct(struct, parser))
+
+        interfaces = self.add_all("interfaces", f.interfaces, lambda interface: self.add("interfaces",
+            [self.string(interface.name)] + self.add_all("functions", interface.functions, self.write_function) +
+            self.comment(interface.c)))
+
+        self.add("files", [self.string(f.name)] + self.strings_range(f.includes) + defines + constants +
+                 typedefs + enums + structs + callbacks + interfaces)
+
+    def write(self, parser, outfile):
+        files = self.add_all("files", parser.files, lambda f: self.write_file(f, parser))
+        self.add("root", files + self.strings_range(parser.packSizeAwareStructs))
+
+        stringdata = bytearray()
+        stringoffsets = self.tables["stringoffsets"]
+        for value in self.strings:
+            stringoffsets.append(len(stringdata))
+            stringdata += value.encode("utf-8")
+        stringoffsets.append(len(stringdata))
+
+        # magic, version, then (offset, length in bytes) of every table and of the string data
+        header = array.array('i', [0] * (2 + 2 * (len(g_SnapshotTables) + 1)))
+        pos = len(g_SnapshotMagic) + header.itemsize * len(header)
+        for i, name in enumerate(g_SnapshotTables):
+            size = len(self.tables[name]) * self.tables[name].itemsize
+            header[2 + 2 * i] = pos
+            header[3 + 2 * i] = size
+            pos += size
+        header[0] = g_SnapshotVersion
+        header[1] = len(g_SnapshotTables)
+        header[-2] = pos
+        header[-1] = len(stringdata)
+
+        outfile.write(g_SnapshotMagic)
+        outfile.write(header.tobytes())
+        for name in g_SnapshotTables:
+            outfile.write(self.tables[name].tobytes())
+        outfile.write(stringdata)
+
+
+class Snapshot:
+    """A parsed SDK read straight out of a buffer written by export_snapshot
+
+    The buffer can be bytes, an mmap or a shared memory block, nothing is copied or
+    unpickled: files, typedefs and packSizeAwareStructs hand out SnapshotViews that read
+    their rows on attribute access."""
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        if bytes(self.buffer[:len(g_SnapshotMagic)]) != g_SnapshotMagic:
+            raise ValueError("Not a steamworksparser snapshot")
+
+        start = len(g_SnapshotMagic)
+        with self.buffer[start:start + 8].cast('i') as version:
+            if version[0] != g_SnapshotVersion or version[1] != len(g_SnapshotTables):
+                raise ValueError("Snapshot was written by a different version of steamworksparser")
+
+        ints = self.buffer[start:start + 4 * (2 + 2 * (len(g_SnapshotTables) + 1))].cast('i')
+
+        self.tables: dict[str, memoryview] = {}
+        for i, name in enumerate(g_SnapshotTables):
+            offset, size = ints[2 + 2 * i], ints[3 + 2 * i]
+            self.tables[name] = self.buffer[offset:offset + size].cast('i')
+        offset, size = ints[2 + 2 * len(g_SnapshotTables)], ints[3 + 2 * len(g_SnapshotTables)]
+        self.stringdata = self.buffer[offset:offset + size]
+        ints.release()
+
+        self.stringCache: dict[int, str] = {}
+        self.root = SnapshotRoot(self, 0)
+        self.source = None  # The mmap or SharedMemory we opened ourselves, closed by close()
+
+    @staticmethod
+    def open(path):
+        """Maps a snapshot file into memory, pages are only read in when a view touches them"""
+        with open(path, 'rb') as infile:
+            data = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        snapshot = Snapshot(data)
+        snapshot.source = data
+        return snapshot
+
+    @staticmethod
+    def attach(name):
+        """Reads a snapshot another process put in shared memory with share_snapshot"""
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(name)
+        snapshot = Snapshot(shm.buf)
+        snapshot.source = shm
+        return snapshot
+
+    def close(self):
+        # Views still pointing into the buffer have to go first, or the mmap refuses to close
+        for table in self.tables.values():
+            table.release()
+        self.stringdata.release()
+        self.buffer.release()
+        if self.source is not None:
+            self.source.close()
+
+    def string(self, sid):
+        if sid < 0:
+            return None
+        value = self.stringCache.get(sid)
+        if value is None:
+            offsets = self.tables["stringoffsets"]
+            value = self.stringCache[sid] = str(self.stringdata[offsets[sid]:offsets[sid + 1]], "utf-8")
+        return value
+
+    def read(self, table, row, offset, kind):
+        view = g_SnapshotViews[table]
+        pos = row * view.ncolumns + offset
+        value = self.tables[table][pos]
+
+        if kind == "s":
+            return self.string(value)
+        if kind == "i":
+            if value == -1:
+                return None
+            if value == -2:
+                return 'intptr'
+            return value
+        if kind == "b":
+            return bool(value)
+
+        count = self.tables[table][pos + 1]
+        if kind == "S":
+            stringlists = self.tables["stringlists"]
+            return [self.string(stringlists[i]) for i in range(value, value + count)]
+
+        child = g_SnapshotViews[kind]
+        return [child(self, i) for i in range(value, value + count)]
+
+    @property
+    def files(self):
+        return self.root.files
+
+    @property
+    def typedefs(self):
+        return [typedef for f in self.files for typedef in f.typedefs]
+
+    @property
+    def packSizeAwareStructs(self):
+        return self.root.packSizeAwareStructs
+
+
+def export_snapshot(parser, outfile):
+    """Writes the model to a binary file object in the format Snapshot reads"""
+    SnapshotWriter().write(parser, outfile)
+
+
+def share_snapshot(parser, name=None):
+    """Puts a snapshot of the model in a new shared memory block for Snapshot.attach
+
+    The caller owns the returned SharedMemory and has to close() and unlink() it once every reader is done."""
+    from multiprocessing import shared_memory
+    buffer = io.BytesIO()
+    export_snapshot(parser, buffer)
+    data = buffer.getbuffer()
+    shm = shared_memory.SharedMemory(name, create=True, size=len(data))
+    shm.buf[:len(data)] = data
+    return shm
+
+
+def get_fingerprint(*values):
+    return hashlib.blake2b(repr(values).encode(), digest_size=16).hexdigest()
+
+
+def get_comment_values(c):
+    if c is None:
+        return None
+    return (c.precomments, c.linecomment)
+
+
+def get_fingerprints(parser, comments=False):
+    """Returns a content fingerprint for every entity of the model, keyed by (kind, name)
+
+    kind is "define", "constant", "typedef", "enum", "struct", "callback", "interface", "function"
+    or "layout", functions are named "Interface::Function" and "layout" covers the computed offsets
+    of each struct and callback. Comments are only part of the fingerprints if comments is True."""
+    fingerprints = {}
+
+    def add(kind, name, fingerprint):
+        key = (kind, name)
+        n = 1
+        while key in fingerprints:
+            # Later definitions of the same name, keep them apart instead of overwriting
+            n += 1
+            key = (kind, name + "#" + str(n))
+        fingerprints[key] = fingerprint
+
+    def comment(c):
+        return get_comment_values(c) if comments else None
+
+    for f in parser.files:
+        for define in f.defines:
+            add("define", define.name, get_fingerprint(define.value, define.expression, comment(define.c)))
+
+        for constant in f.constants:
+            add("constant", constant.name, get_fingerprint(constant.type, constant.value, constant.expression, comment(constant.c)))
+
+        for typedef in f.typedefs:
+            add("typedef", typedef.name, get_fingerprint(typedef.type, typedef.size, typedef.pack, comment(typedef.c)))
+
+        for enum in f.enums:
+            add("enum", enum.name, get_fingerprint(
+                [(field.name, field.value, comment(field.c)) for field in enum.fields], comment(enum.c)))
+
+        for kind, structs in (("struct", f.structs), ("callback", f.callbacks)):
+            for struct in structs:
+                layouts = []
+                for pack in g_LayoutPacks:
+                    layout = parser.get_struct_layout(struct, pack)
+                    if layout is not None:
+                        layouts.append((pack, layout.size, layout.align, [(field.name, field.offset, field.size) for field in layout.fields]))
+                layout = get_fingerprint(layouts)
+
+                add("layout", struct.name, layout)
+                add(kind, struct.name, get_fingerprint(
+                    struct.packsize, struct.callbackid, layout,
+                    [(field.name, field.type, field.arraysize, comment(field.c)) for field in struct.fields],
+                    comment(struct.c)))
+
+        for interface in f.interfaces:
+            functions = []
+            for function in interface.functions:
+                fingerprint = get_fingerprint(
+                    function.returntype, function.private, function.ifstatements,
+                    [(attribute.name, attribute.value) for attribute in function.attributes],
+                    [(arg.type, arg.name, arg.default, arg.attribute and (arg.attribute.name, arg.attribute.value)) for arg in function.args],
+                    (function.comments, function.linecomment) if comments else None)
+                add("function", interface.name + "::" + function.name, fingerprint)
+                functions.append((function.name, fingerprint))
+
+            add("interface", interface.name, get_fingerprint(functions, comment(interface.c)))
+
+    return fingerprints
+
+
+class ModelDiff:
+    """What changed between two parses, as lists of (kind, name) keys like get_fingerprints returns"""
+
+    def __init__(self, added, removed, changed):
+        self.added: list[tuple[str, str]] = added
+        self.removed: list[tuple[str, str]] = removed
+        self.changed: list[tuple[str, str]] = changed
+
+    @property
+    def layoutChanges(self):
+        return [name for kind, name in self.changed if kind == "layout"]
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+def diff(old, new, comments=False):
+    """Compares two parsed models entity by entity, in time linear in their size"""
+    oldFingerprints = get_fingerprints(old, comments)
+    newFingerprints = get_fingerprints(new, comments)
+
+    added = [key for key in newFingerprints if key not in oldFingerprints]
+    removed = [key for key in oldFingerprints if key not in newFingerprints]
+    changed = [key for key, fingerprint in newFingerprints.items()
+               if key in oldFingerprints and oldFingerprints[key] != fingerprint]
+    return ModelDiff(added, removed, changed)
+
+
+def iter_parse(folder, jobs=None, only=None):
+    """Parses the Steamworks headers contained in a folder one file at a time
+
+    Iterating over the returned ParseStream yields every SteamFile as soon as its lines
+    are parsed, ParseStream.finish() then runs the cross-file typedef and layout passes
+    and returns the Parser."""
+    return ParseStream(folder, jobs, only)
+
+
+def parse(folder, cachedir=None, jobs=None, only=None):
+    """Parses the Steamworks headers contained in a folder
+
+    If cachedir is given the parsed model is loaded from there when the headers,
+    Settings and parser version are unchanged, and saved there otherwise.
+    If jobs is given the headers are parsed in that many worker processes, 0 uses every core.
+    If only is given, a list of interface, struct or header names, just the headers those
+    need are parsed: the ones defining them, their includes and the headers declaring every
+    type and constant they use."""
+    if cachedir is None:
+        return Parser(folder, jobs, only)
+
+    key = get_cache_key(folder, only)
+    parser = Parser.load_cache(folder, cachedir, key)
+    if parser is None:
+        parser = Parser(folder, jobs, only)
+        parser.save_cache(cachedir, key)
+
+    return parser
+
+
+async def parse_async(folder, cachedir=None, jobs=None, only=None, executor=None):
+    """Parses the Steamworks headers contained in a folder without blocking the running event loop
+
+    Every header read, per-file parse and cross-file phase runs in executor, the loop's default
+    thread pool if it is None, and the coroutine goes back to the loop between each of them.
+    The steps share the Parser, so executor has to run threads; use jobs for worker processes.
+    jobs, only and cachedir work as in parse(). Each call has its own Parser, so several
+    parses can be awaited at once."""
+    # Imported here, most callers never use it and it is slow to import
+    import asyncio
+
+    if isinstance(executor, ProcessPoolExecutor):
+        raise TypeError("parse_async needs a thread-based executor, the parse steps share the Parser; pass jobs= to parse in worker processes")
+
+    loop = asyncio.get_running_loop()
+
+    if cachedir is not None:
+        key = await loop.run_in_executor(executor, get_cache_key, folder, only)
+        parser = await loop.run_in_executor(executor, Parser.load_cache, folder, cachedir, key)
+        if parser is not None:
+            return parser
+
+    parser = Parser.__new__(Parser)
+    parser.begin(folder)
+
+    # The generators are only ever advanced by one worker at a time, one step per await.
+    # next() gets a default since StopIteration cannot travel through a Future.
+    files = parser.iter_files(jobs, only)
+    while await loop.run_in_executor(executor, next, files, None) is not None:
+        pass
+
+    phases = parser.iter_finish()
+    while await loop.run_in_executor(executor, next, phases, None) is not None:
+        pass
+    parser.report()
+
+    if cachedir is not None:
+        await loop.run_in_executor(executor, parser.save_cache, cachedir, key)
+
+    return parser
+
+
+def parse_batch(folders, jobs=None):
+    """Parses several SDK folders, typically different versions of the SDK, and returns a Parser for each
+
+    Every header is hashed first and each distinct (file name, content) pair is only parsed once,
+    the Parsers of every folder containing it share the same SteamFile. The cross-file passes
+    still run per folder; a shared file whose layouts come out different in some folder gets a
+    private copy there. Treat the results as read-only, changing a shared file changes it for
+    every folder, and so does Parser.update()."""
+    names = {}
+    keys = {}
+    firstfolder = {}
+    for folder in folders:
+        names[folder] = list_header_files(folder)
+        for name in names[folder]:
+            with open(os.path.join(folder, name), 'rb') as infile:
+                key = (name, hashlib.sha256(infile.read()).digest())
+            keys[(folder, name)] = key
+            firstfolder.setdefault(key, folder)
+
+    # Parse every distinct file once, the same way a worker process of Parser.iter_files does
+    unique = list(firstfolder)
+    settings = get_settings()
+    args = ([firstfolder[key] for key in unique], [key[0] for key in unique], [settings] * len(unique))
+    if jobs is not None and jobs != 1 and len(unique) > 1:
+        if jobs <= 0:
+            jobs = os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_parse_file_job, *args, chunksize=max(1, len(unique) // (jobs * 4))))
+    else:
+        results = list(map(_parse_file_job, *args))
+    parsed = dict(zip(unique, results))
+
+    def make_parser(folder, files):
+        parser = Parser.__new__(Parser)
+        parser.begin(folder)
+        for name, f in zip(names[folder], files):
+            _, stats, records = parsed[keys[(folder, name)]]
+            parser.files.append(f)
+            parser.typedefs.extend(f.typedefs)
+            parser.stats.merge(stats)
+            parser.diagnostics.merge([copy.copy(record) for record in records])
+
+        for phase in parser.iter_finish():
+            pass
+        return parser
+
+    parsers = []
+    # key -> layout state of a shared file as the first folder using it computed it, the file always holds this one
+    layoutStates = {}
+    for folder in folders:
+        files = [parsed[keys[(folder, name)]][0] for name in names[folder]]
+        parser = make_parser(folder, files)
+
+        bCopied = False
+        for i, f in enumerate(files):
+            key = keys[(folder, f.name)]
+            if key not in layoutStates:
+                layoutStates[key] = get_layout_state(f)
+            elif get_layout_state(f) != layoutStates[key]:
+                # Same header, different layouts because of some other header, this folder needs its own copy
+                files[i] = copy.deepcopy(f)
+                set_layout_state(f, layoutStates[key])
+                bCopied = True
+
+        if bCopied:
+            # Every pass again over the copies, so the symbols, constants, callbacks and
+            # GameServer interfaces all point at this folder's own objects
+            parser = make_parser(folder, files)
+
+        parser.report()
+        parsers.append(parser)
+
+    return parsers
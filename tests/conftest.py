@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import steamworksparser
+
+
+@pytest.fixture(autouse=True)
+def quiet_diagnostics(monkeypatch):
+    monkeypatch.setattr(steamworksparser.Settings, "print_diagnostics", False)
+
+
+@pytest.fixture
+def write_headers(tmp_path):
+    """Writes {name: text} into a fresh folder and returns its path"""
+    def write(headers, folder="sdk"):
+        path = tmp_path / folder
+        path.mkdir(exist_ok=True)
+        for name, text in headers.items():
+            (path / name).write_text(text)
+        return str(path)
+    return write
+
+
+@pytest.fixture(scope="session")
+def sdk(tmp_path_factory):
+    """A synthetic SDK from benchmark.generate_corpus"""
+    import benchmark
+
+    folder = str(tmp_path_factory.mktemp("synthetic"))
+    benchmark.generate_corpus(folder)
+    return folder
@@ -0,0 +1,34 @@
+import tracemalloc
+
+import pytest
+
+import benchmark
+import steamworksparser
+
+# Peak memory of a full parse of the synthetic corpus at g_Scale, about 13.5 MiB when this was written
+g_Scale = 3
+g_PeakBudget = 16 * 2**20
+
+
+@pytest.mark.parametrize("cls", [
+    steamworksparser.Arg, steamworksparser.ArgAttribute, steamworksparser.Function, steamworksparser.FunctionAttribute,
+    steamworksparser.EnumField, steamworksparser.StructField, steamworksparser.Comment, steamworksparser.LazyComment,
+    steamworksparser.Typedef, steamworksparser.Constant, steamworksparser.Define,
+])
+def test_model_classes_have_no_dict(cls):
+    assert not hasattr(cls.__new__(cls), "__dict__")
+
+
+def test_parse_peak_memory(tmp_path):
+    folder = str(tmp_path)
+    benchmark.generate_corpus(folder, g_Scale)
+
+    tracemalloc.start()
+    try:
+        parser = steamworksparser.parse(folder)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(parser.files) == benchmark.g_SdkInterfaces * g_Scale + 1
+    assert peak < g_PeakBudget, f"peak {peak / 2**20:.1f} MiB is over the {g_PeakBudget / 2**20:.0f} MiB budget"
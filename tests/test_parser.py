@@ -0,0 +1,426 @@
+import io
+import json
+import os
+import pstats
+import subprocess
+import sys
+
+import pytest
+
+import steamworksparser
+
+
+def assert_same_model(expected, actual):
+    diff = steamworksparser.diff(expected, actual, comments=True)
+    assert (diff.added, diff.removed, diff.changed) == ([], [], [])
+
+
+def get_struct(parser, name):
+    return next(struct for f in parser.files for struct in f.structs + f.callbacks if struct.name == name)
+
+
+def test_callback_pack_block_pushes_once(write_headers):
+    folder = write_headers({"isteamtest.h": """
+#pragma pack( push, 4 )
+struct Outer_t
+{
+	int m_n;
+};
+#if defined( VALVE_CALLBACK_PACK_SMALL )
+#pragma pack( push, 4 )
+#elif defined( VALVE_CALLBACK_PACK_LARGE )
+#pragma pack( push, 8 )
+#else
+#error steam_api_common.h should define VALVE_CALLBACK_PACK_xxx
+#endif
+struct Callback_t
+{
+	enum { k_iCallback = 1 };
+	int m_n;
+};
+#pragma pack( pop )
+struct After_t
+{
+	int m_n;
+};
+#pragma pack( pop )
+"""})
+    parser = steamworksparser.parse(folder)
+
+    assert get_struct(parser, "Callback_t").packsize is None
+    assert get_struct(parser, "After_t").packsize == 4
+
+
+def test_import_leaves_optional_packages_alone():
+    code = "import sys, steamworksparser; print(sorted({'numpy', 'msgpack', 'asyncio'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_layout_matrix_matches_layouts(sdk):
+    pytest.importorskip("numpy")
+    parser = steamworksparser.parse(sdk)
+    matrix = steamworksparser.compute_layout_matrix(parser, packs=steamworksparser.g_LayoutPacks, pointerSizes=(8,))
+
+    for struct in matrix.structs:
+        for pack in steamworksparser.g_LayoutPacks:
+            expected = parser.get_struct_layout(struct, pack)
+            layout = matrix.layout(struct.name, pack, 8)
+            assert (layout.size, layout.fields) == (expected.size, expected.fields), (struct.name, pack)
+
+
+def test_msgpack_matches_json(sdk):
+    msgpack = pytest.importorskip("msgpack")
+    parser = steamworksparser.parse(sdk)
+
+    text = io.StringIO()
+    steamworksparser.export_json(parser, text)
+    binary = io.BytesIO()
+    steamworksparser.export_msgpack(parser, binary)
+
+    assert msgpack.unpackb(binary.getvalue(), strict_map_key=False) == json.loads(text.getvalue())
+
+
+def test_parse_async_matches_parse(sdk, write_headers):
+    import asyncio
+
+    other = write_headers({"isteamtest.h": "struct Test_t\n{\n\tint m_n;\n};\n"})
+
+    async def parse_both():
+        return await asyncio.gather(steamworksparser.parse_async(sdk), steamworksparser.parse_async(other, only=["Test_t"]))
+
+    first, second = asyncio.run(parse_both())
+    assert_same_model(steamworksparser.parse(sdk), first)
+    assert [f.name for f in second.files] == ["isteamtest.h"]
+
+
+def assert_same_as_snapshot(live, view):
+    for name, kind in view.columns:
+        if name in ("precomments", "linecomment") and view.commented:
+            expected = getattr(live.c, name)
+        elif hasattr(live, name):
+            expected = getattr(live, name)
+        else:
+            continue
+
+        actual = getattr(view, name)
+        if kind in steamworksparser.g_SnapshotViews:
+            assert len(actual) == len(expected), (view, name)
+            for liveChild, viewChild in zip(expected, actual):
+                assert_same_as_snapshot(liveChild, viewChild)
+        elif kind == "b":
+            assert actual == bool(expected), (view, name)
+        else:
+            assert actual == expected, (view, name)
+
+
+def test_snapshot_round_trip(sdk, write_headers, tmp_path):
+    folder = write_headers({"isteamtest.h": """
+#ifndef ISTEAMTEST_H
+#define ISTEAMTEST_H
+class ISteamTest
+{
+public:
+#if defined(_PS3)
+	virtual bool PS3Only( int nValue ) = 0;
+#endif
+	virtual bool Everywhere( int nValue ) = 0;
+};
+#endif // ISTEAMTEST_H
+"""})
+    for parser in (steamworksparser.parse(sdk), steamworksparser.parse(folder)):
+        path = str(tmp_path / "model.snapshot")
+        with open(path, 'wb') as outfile:
+            steamworksparser.export_snapshot(parser, outfile)
+
+        snapshot = steamworksparser.Snapshot.open(path)
+        try:
+            assert snapshot.packSizeAwareStructs == parser.packSizeAwareStructs
+            assert len(snapshot.files) == len(parser.files)
+            for f, view in zip(parser.files, snapshot.files):
+                assert_same_as_snapshot(f, view)
+            ifstatements = [function.ifstatements for view in snapshot.files for interface in view.interfaces for function in interface.functions]
+        finally:
+            snapshot.close()
+
+    assert ifstatements == ["defined(_PS3)", []]
+
+
+def test_lazy_comments_stay_lazy(sdk, monkeypatch):
+    eager = io.StringIO()
+    steamworksparser.export_json(steamworksparser.parse(sdk), eager)
+
+    monkeypatch.setattr(steamworksparser.Settings, "lazy_comments", True)
+    parser = steamworksparser.parse(sdk)
+    functions = [function for f in parser.files for interface in f.interfaces for function in interface.functions]
+    assert functions and all(isinstance(function.c, steamworksparser.LazyComment) and function.c.values is None for function in functions)
+
+    lazy = io.StringIO()
+    steamworksparser.export_json(parser, lazy)
+    assert lazy.getvalue() == eager.getvalue()
+
+
+@pytest.mark.parametrize("jobs", [None, 2])
+def test_profile_covers_every_file(sdk, tmp_path, monkeypatch, jobs):
+    monkeypatch.setattr(steamworksparser.Settings, "profile_phases", ("line_loop",))
+    monkeypatch.setattr(steamworksparser.Settings, "profile_dir", str(tmp_path))
+    parser = steamworksparser.parse(sdk, jobs=jobs)
+
+    stats = pstats.Stats(str(tmp_path / "line_loop.prof"))
+    calls = [value[1] for (filename, line, name), value in stats.stats.items() if name == "parse" and filename == steamworksparser.__file__]
+    assert calls == [len(parser.files)]
+
+    phaseTimes = parser.stats.workerPhaseTimes if jobs else parser.stats.phaseTimes
+    assert "line_loop" in phaseTimes
+    assert ("line_loop" in parser.stats.phaseTimes) == (not jobs)
+    assert parser.stats.typeResolveCacheHits > 0
+
+
+def test_parse_batch_matches_parse(write_headers, monkeypatch):
+    monkeypatch.setattr(steamworksparser.Settings, "fake_gameserver_interfaces", True)
+    shared = {
+        "isteamugc.h": """
+#include "steamtypes.h"
+const int k_iSteamUGCCallbacks = 3400;
+struct UGCHandle_t
+{
+	Handle_t m_handle;
+	char m_rgchName[k_cchNameMax];
+};
+struct UGCResult_t
+{
+	enum { k_iCallback = k_iSteamUGCCallbacks + 1 };
+	UGCHandle_t m_handle;
+};
+class ISteamUGC
+{
+public:
+	virtual bool GetHandle( UGCHandle_t *pHandle ) = 0;
+};
+""",
+        "isteamutils.h": """
+struct Unchanged_t
+{
+	int m_n;
+};
+""",
+    }
+    old = write_headers(dict(shared, **{"steamtypes.h": "typedef int Handle_t;\nconst int k_cchNameMax = 8;\n"}), "old")
+    new = write_headers(dict(shared, **{"steamtypes.h": "typedef long long Handle_t;\nconst int k_cchNameMax = 16;\n"}), "new")
+
+    parsers = steamworksparser.parse_batch([old, new])
+    files = [{f.name: f for f in parser.files} for parser in parsers]
+    assert files[0]["isteamutils.h"] is files[1]["isteamutils.h"]
+    assert files[0]["isteamugc.h"] is not files[1]["isteamugc.h"]
+
+    for folder, parser in zip((old, new), parsers):
+        expected = steamworksparser.parse(folder)
+        assert_same_model(expected, parser)
+        assert parser.constantValues == expected.constantValues
+        assert parser.packSizeAwareStructs == expected.packSizeAwareStructs
+
+        f = next(f for f in parser.files if f.name == "isteamugc.h")
+        assert parser.callbackStructs[3401] is f.callbacks[0]
+        assert parser.resolve_symbol("UGCHandle_t", f.name) is f.structs[0]
+        gameserver = next(f for f in parser.files if f.name == "isteamgameserverugc.h")
+        assert gameserver.interfaces[0].base is f.interfaces[0]
+
+
+def test_duplicate_names_resolve_through_includes(write_headers):
+    folder = write_headers({
+        "a_types.h": "typedef unsigned char Small_t;\nstruct Shared_t\n{\n\tchar m_c;\n};\n",
+        "b_types.h": "typedef long long Small_t;\nstruct Shared_t\n{\n\tlong long m_a;\n\tlong long m_b;\n};\n",
+        "c_user.h": '#include "a_types.h"\ntypedef Small_t Alias_t;\nstruct UserA_t\n{\n\tShared_t m_shared;\n\tAlias_t m_alias;\n};\n',
+        "d_user.h": '#include "b_types.h"\ntypedef Small_t Alias_t;\nstruct UserB_t\n{\n\tShared_t m_shared;\n\tAlias_t m_alias;\n};\n',
+    })
+    parser = steamworksparser.parse(folder)
+
+    assert get_struct(parser, "UserA_t").size == 2
+    assert get_struct(parser, "UserB_t").size == 24
+    sizes = {(typedef.filename, typedef.name): typedef.size for typedef in parser.typedefs}
+    assert sizes[("c_user.h", "Alias_t")] == 1
+    assert sizes[("d_user.h", "Alias_t")] == 8
+
+
+def test_cached_parse_matches_parse(sdk, tmp_path):
+    expected = io.StringIO()
+    steamworksparser.export_json(steamworksparser.parse(sdk), expected)
+
+    steamworksparser.parse(sdk, cachedir=str(tmp_path))
+    cached = io.StringIO()
+    steamworksparser.export_json(steamworksparser.parse(sdk, cachedir=str(tmp_path)), cached)
+    assert cached.getvalue() == expected.getvalue()
+
+
+def test_iter_parse_yields_includes_first(write_headers):
+    folder = write_headers({
+        "a.h": '\ufeff/* Copyright\n   block comment */\n#ifndef A_H\n#define A_H\n#include "z.h"\nstruct A_t\n{\n\tZ_t m_z;\n};\n#endif\n',
+        "z.h": "typedef int Z_t;\n",
+    })
+    stream = steamworksparser.iter_parse(folder)
+    assert [f.name for f in stream] == ["z.h", "a.h"]
+    assert [f.name for f in stream.finish().files] == ["a.h", "z.h"]
+
+
+def test_nested_struct_is_diagnosed(write_headers):
+    folder = write_headers({"isteamtest.h": """
+struct Outer_t
+{
+	struct Inner_t
+	{
+		int m_a;
+	};
+	struct OneLine_t { int m_a; };
+	int m_b;
+};
+struct Next_t
+{
+	int m_c;
+};
+"""})
+    parser = steamworksparser.parse(folder)
+
+    assert [field.name for field in get_struct(parser, "Outer_t").fields] == ["m_b"]
+    assert [field.name for field in get_struct(parser, "Next_t").fields] == ["m_c"]
+    assert [record.line for record in parser.diagnostics.records if record.kind == "unhandled"] == [3, 7]
+
+
+def test_constant_expressions(write_headers):
+    folder = write_headers({"isteamtest.h": """
+#define k_nShift ( 1 << 3 ) // eight
+#define STEAMTEST_INTERFACE_VERSION "SteamTest001"
+const int k_cchPlain = 16;
+const int k_cchLiterals = 0x10 + 010 + 4u + 2ull;
+const int k_nCycleA = k_nCycleB + 1;
+const int k_nCycleB = k_nCycleA + 1;
+const int k_nUnknown = k_nMissing * 2;
+enum { k_nDouble = k_cchPlain * 2 };
+enum ETest
+{
+	k_ETestFirst = 1,
+	k_ETestSecond,
+	k_ETestAlias = k_ETestFirst,
+	k_ETestShifted = k_nShift,
+};
+"""})
+    parser = steamworksparser.parse(folder)
+
+    values = parser.constantValues
+    assert values["k_nShift"] == 8
+    assert values["k_cchLiterals"] == 30
+    assert values["k_nDouble"] == 32
+    assert values["STEAMTEST_INTERFACE_VERSION"] is None
+    assert (values["k_ETestFirst"], values["k_ETestSecond"], values["k_ETestShifted"]) == (1, 2, 8)
+    assert parser.enumValueNames["ETest"] == {1: "k_ETestFirst", 2: "k_ETestSecond", 8: "k_ETestShifted"}
+    assert parser.constantDependencies["k_nDouble"] == ["k_cchPlain"]
+    assert parser.evaluate("k_cchPlain * 2 + ( k_nShift >> 1 )") == 36
+
+    with pytest.raises(steamworksparser.ConstantExpressionError) as error:
+        parser.evaluate("k_nUnknown + 1")
+    assert error.value.symbol == "k_nMissing"
+
+    messages = [record.message for record in parser.diagnostics.records if record.kind == "warning"]
+    assert any("k_nCycleA" in message and "cycle" in message for message in messages)
+    assert any("k_nUnknown" in message and "k_nMissing" in message for message in messages)
+    assert not any("STEAMTEST_INTERFACE_VERSION" in message for message in messages)
+
+
+def test_update_replaces_layouts(write_headers):
+    folder = write_headers({"isteamtest.h": "struct A_t\n{\n\tint m_a;\n};\n"})
+    parser = steamworksparser.parse(folder)
+    numlayouts = len(parser.structLayouts)
+
+    with open(os.path.join(folder, "isteamtest.h"), 'w') as outfile:
+        outfile.write("struct A_t\n{\n\tint m_a;\n\tlong long m_b;\n};\n")
+    parser.update([os.path.join(folder, "isteamtest.h")])
+
+    assert get_struct(parser, "A_t").size == 16
+    assert parser.layouts[("A_t", 8)].size == 16
+    assert len(parser.structLayouts) == numlayouts
+
+
+def test_update_matches_parse(write_headers, monkeypatch):
+    monkeypatch.setattr(steamworksparser.Settings, "fake_gameserver_interfaces", True)
+    folder = write_headers({
+        "a.h": "typedef int Handle_t;\nconst int k_cchMax = 8;\nconst int k_cchTwice = k_cchMax * 2;\n",
+        "b.h": '#include "a.h"\nstruct B_t\n{\n\tchar m_rgch[k_cchMax];\n};\nstruct C_t\n{\n\tchar m_rgch[k_cchTwice];\n\tHandle_t m_handle;\n};\n',
+        "isteamugc.h": '#include "b.h"\nclass ISteamUGC\n{\npublic:\n\tvirtual bool GetB( B_t *pB ) = 0;\n};\n',
+        "old.h": "struct Old_t\n{\n\tint m_n;\n};\n",
+    })
+    parser = steamworksparser.parse(folder)
+
+    def change(name, text):
+        path = os.path.join(folder, name)
+        if text is None:
+            os.remove(path)
+        else:
+            with open(path, 'w') as outfile:
+                outfile.write(text)
+        parser.update([path])
+        expected = steamworksparser.parse(folder)
+        assert_same_model(expected, parser)
+        assert parser.constantValues == expected.constantValues
+        assert {key: layout.size for key, layout in parser.layouts.items()} == {key: layout.size for key, layout in expected.layouts.items()}
+
+    change("a.h", "typedef long long Handle_t;\nconst int k_cchMax = 8;\nconst int k_cchTwice = k_cchMax * 2;\n")
+    change("a.h", "typedef long long Handle_t;\nconst int k_cchMax = 64;\nconst int k_cchTwice = k_cchMax * 2;\n")
+    assert get_struct(parser, "B_t").size == 64
+    assert get_struct(parser, "C_t").size == 136
+    change("old.h", None)
+    change("new.h", '#include "b.h"\nstruct New_t\n{\n\tB_t m_b;\n};\n')
+    assert get_struct(parser, "New_t").size == 64
+    assert [f.name for f in parser.files] == ["a.h", "b.h", "isteamugc.h", "new.h", "isteamgameserverugc.h"]
+
+
+def test_parse_async_executors(sdk):
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    with ThreadPoolExecutor(2) as executor:
+        parser = asyncio.run(steamworksparser.parse_async(sdk, executor=executor))
+    assert_same_model(steamworksparser.parse(sdk), parser)
+
+    with ProcessPoolExecutor(1) as executor:
+        with pytest.raises(TypeError, match="jobs="):
+            asyncio.run(steamworksparser.parse_async(sdk, executor=executor))
+
+
+def test_queries(write_headers, monkeypatch):
+    monkeypatch.setattr(steamworksparser.Settings, "fake_gameserver_interfaces", True)
+    header = """
+class ISteamUGC
+{
+public:
+	STEAM_CALL_RESULT( Result_t )
+	virtual SteamAPICall_t Request( uint32 nFirst, uint32 nSecond ) = 0;
+	virtual bool GetName( STEAM_OUT_STRING_COUNT( cchName ) char *pchName, uint32 cchName ) = 0;
+	virtual SteamAPICall_t Other( const char *pchName ) = 0;
+};
+"""
+    folder = write_headers({"isteamugc.h": header})
+    parser = steamworksparser.parse(folder)
+
+    def names(entries):
+        return sorted((entry[0].name,) + tuple(item.name for item in entry[1:]) for entry in entries)
+
+    assert names(parser.find_functions(name="GetName")) == [("ISteamGameServerUGC", "GetName"), ("ISteamUGC", "GetName")]
+    assert names(parser.find_functions(returntype="SteamAPICall_t")) == [
+        ("ISteamGameServerUGC", "Other"), ("ISteamGameServerUGC", "Request"), ("ISteamUGC", "Other"), ("ISteamUGC", "Request")]
+    assert names(parser.find_functions(attribute="STEAM_CALL_RESULT")) == [("ISteamGameServerUGC", "Request"), ("ISteamUGC", "Request")]
+    # Request takes two uint32s but is listed once
+    assert names(parser.find_functions(argtype="uint32")) == [
+        ("ISteamGameServerUGC", "GetName"), ("ISteamGameServerUGC", "Request"), ("ISteamUGC", "GetName"), ("ISteamUGC", "Request")]
+    assert names(parser.find_functions(returntype="SteamAPICall_t", argtype="uint32")) == [("ISteamGameServerUGC", "Request"), ("ISteamUGC", "Request")]
+    assert parser.find_functions(name="GetName", returntype="SteamAPICall_t") == []
+
+    assert names(parser.find_args(type_="uint32")) == [
+        ("ISteamGameServerUGC", "GetName", "cchName"), ("ISteamGameServerUGC", "Request", "nFirst"), ("ISteamGameServerUGC", "Request", "nSecond"),
+        ("ISteamUGC", "GetName", "cchName"), ("ISteamUGC", "Request", "nFirst"), ("ISteamUGC", "Request", "nSecond")]
+    assert names(parser.find_args(type_="char *", attribute="STEAM_OUT_STRING_COUNT")) == [
+        ("ISteamGameServerUGC", "GetName", "pchName"), ("ISteamUGC", "GetName", "pchName")]
+
+    with open(os.path.join(folder, "isteamugc.h"), 'w') as outfile:
+        outfile.write(header.replace("Other", "Renamed"))
+    parser.update([os.path.join(folder, "isteamugc.h")])
+    assert parser.find_functions(name="Other") == []
+    assert names(parser.find_functions(name="Renamed")) == [("ISteamGameServerUGC", "Renamed"), ("ISteamUGC", "Renamed")]